@@ -0,0 +1,46 @@
+import io
+import json
+import os
+import timeit
+import typing
+from lxml import html
+
+from hearthstone import extract
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+
+
+# The full DOM parse + XPath extraction the scrapers used before hearthstone.extract
+def replay_dom(content: bytes) -> typing.Tuple[str, typing.List[int]]:
+    deck_info = html.parse(io.BytesIO(content)).xpath("body/div[@id = 'deck-info']")[0]
+    return deck_info.attrib['data-deck-class'], [int(id) for id in deck_info.attrib['data-deck-cards'].split(',')]
+
+
+def hearthpwn_dom(content: bytes) -> typing.Tuple[str, typing.List[typing.Tuple[int, int]]]:
+    document = html.parse(io.BytesIO(content))
+    hs_class = document.xpath('body/div/div/div/div/section/header/section/span/@class')[0].split('-')[-1].upper()
+    card_nodes = document.xpath('body/div/div/div/div/section/div/div/aside/section/div/div/table/tbody/tr/td/b/a')
+    return hs_class, [(int(node.attrib['data-id']), int(node.attrib['data-count'])) for node in card_nodes]
+
+
+def main(number: int = 200) -> None:
+    results = {}
+    for page, dom, streaming in (
+            ('replay_deck.html', replay_dom, extract.replay_deck_info),
+            ('hearthpwn_deck.html', hearthpwn_dom, extract.hearthpwn_deck_info),
+    ):
+        with open(os.path.join(FIXTURES, page), 'rb') as stream:
+            content = stream.read()
+        assert dom(content) == streaming(content)
+
+        results[page] = {
+            'dom_seconds': timeit.timeit(lambda: dom(content), number=number) / number,
+            'streaming_seconds': timeit.timeit(lambda: streaming(content), number=number) / number,
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import typing
+import click
+import numpy as np
+
+from hearthstone import api
+from hearthstone import deck
+
+from hs_deckgen import model as hs_model
+
+import synthetic
+
+
+def measure(function: typing.Callable[[], typing.Any], repeat: int = 1) -> typing.Dict[str, typing.Any]:
+    # Peak memory is traced on one extra call, tracing slows the timed ones down
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'repeat': repeat, 'peak_bytes': peak}
+
+
+@click.command()
+@click.option('--cards', type=int, default=synthetic.CARD_COUNT, help='Cards in the synthetic catalogue')
+@click.option('--decks', type=int, default=5000, help='Decks in the synthetic corpus')
+@click.option('--storage', type=str, default='dense')
+@click.option('--dtype', type=str, default='float64', help='Type the deck counts are kept in')
+@click.option('--processes', type=int, default=4, help='Workers for the from_decks benchmark')
+@click.option('--repeat', type=int, default=3)
+@click.option('--outfile', type=click.Path(dir_okay=False), required=False)
+def main(cards: int, decks: int, storage: str, dtype: str, processes: int, repeat: int,
+         outfile: typing.Optional[str]) -> None:
+    catalogue = synthetic.card_catalogue(cards)
+    # Everything that looks cards up by id goes through the synthetic catalogue
+    api.HearthstoneAPI._CATALOGUE = catalogue  # pylint: disable=protected-access
+    corpus = synthetic.deck_ids(catalogue, decks)
+    card_decks = [[catalogue.card_from_id(int(card_id)) for card_id in card_ids] for _, card_ids in corpus]
+
+    trained = hs_model.HSModel(storage, catalogue, dtype)
+    trained.train_ids(card_ids for _, card_ids in corpus)
+    hs_class, _ = corpus[0]
+    partial = card_decks[0][:5]
+    full_decks = [deck.Deck(cards, deck_class) for (deck_class, _), cards in zip(corpus[:1000], card_decks)]
+
+    path = os.path.join(tempfile.mkdtemp(), 'model')
+    trained.save_file(path)
+
+    def load(mmap_mode: typing.Optional[str]) -> hs_model.HSModel:
+        with open(path, 'rb') as stream:
+            return hs_model.HSModel.load(stream, mmap_mode)
+
+    def train_many() -> None:
+        hs_model.HSModel(storage, catalogue, dtype).train_many(card_decks)
+
+    def train_loop() -> None:
+        # What train_many batches up, one deck at a time, over the same corpus
+        mod = hs_model.HSModel(storage, catalogue, dtype)
+        for sub_deck in card_decks:
+            mod.train(sub_deck)
+
+    results = {
+        'construct': measure(lambda: hs_model.HSModel(storage, catalogue, dtype), repeat),
+        'train_loop': measure(train_loop, repeat),
+        'train_many': measure(train_many, repeat),
+        'from_decks_processes': measure(
+            lambda: hs_model.HSModel.from_decks(card_decks, storage, processes, catalogue, dtype), repeat),
+        'generate_deck': measure(lambda: trained.generate_deck(partial, hs_class), repeat),
+        'generate_decks_100': measure(lambda: trained.generate_decks(partial, hs_class, 100, seed=0), repeat),
+        'save': measure(lambda: trained.save(io.BytesIO()), repeat),
+        'load': measure(lambda: load(None), repeat),
+        'load_mmap': measure(lambda: load('r'), repeat),
+        'to_deck_code_1000': measure(lambda: [sub_deck.to_deck_code() for sub_deck in full_decks], repeat),
+        'encode_deck_codes_1000': measure(
+            lambda: deck.encode_deck_codes([0] * len(full_decks), [card_ids for _, card_ids in corpus[:1000]]),
+            repeat),
+    }
+    # Below 1, batching costs more than it saves
+    results['train_many']['speedup_over_loop'] = results['train_loop']['seconds'] / results['train_many']['seconds']
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+    report = {
+        'config': {'cards': cards, 'decks': decks, 'storage': storage, 'dtype': dtype, 'processes': processes,
+                   'repeat': repeat, 'slots': len(trained._norm),  # pylint: disable=protected-access
+                   'model_bytes': trained._model.nbytes},  # pylint: disable=protected-access
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()},
+        'results': results,
+    }
+    encoded = json.dumps(report, indent=2)
+    if outfile:
+        with open(outfile, 'w') as stream:
+            stream.write(encoded)
+    else:
+        print(encoded)
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
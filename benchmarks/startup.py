@@ -0,0 +1,78 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+import click
+
+
+ENTRY_POINTS = {'hsdeck': 'hs_deckgen.cli', 'trainer': 'trainer.cli'}
+# Modules a subcommand should only load when it actually needs them
+HEAVY = ['asyncio', 'lxml', 'requests', 'selenium', 'urllib3']
+
+# Runs a subcommand's --help in a fresh interpreter: every import at module
+# load and the option parsing, but none of the command's own work
+_RUNNER = '''
+import importlib, json, sys
+module, command = sys.argv[1], sys.argv[2:]
+try:
+    importlib.import_module(module).main(command + ['--help'], standalone_mode=False)
+finally:
+    sys.stderr.write(json.dumps(sorted(name for name in {heavy!r} if name in sys.modules)) + '\\n')
+'''.format(heavy=HEAVY)
+
+
+def subcommands() -> typing.List[typing.Tuple[str, str, typing.List[str]]]:
+    import importlib
+    commands = []
+    for entry_point, module in sorted(ENTRY_POINTS.items()):
+        commands.append((entry_point, module, []))
+        for name in sorted(importlib.import_module(module).main.commands):
+            commands.append((entry_point, module, [name]))
+    return commands
+
+
+def start(arguments: typing.List[str], repeat: int) -> typing.Dict[str, typing.Any]:
+    times = []
+    loaded: typing.List[str] = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        done = subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              check=True)
+        times.append(time.perf_counter() - begin)
+        if arguments[0] == '-c' and len(arguments) > 2:
+            loaded = json.loads(done.stderr.decode('utf-8').strip().splitlines()[-1])
+    return {'seconds': min(times), 'median_seconds': statistics.median(times), 'repeat': repeat, 'heavy': loaded}
+
+
+@click.command()
+@click.option('--repeat', type=int, default=10)
+@click.option('--outfile', type=click.Path(dir_okay=False), required=False)
+def main(repeat: int, outfile: typing.Optional[str]) -> None:
+    # Interpreter start and numpy alone, what every subcommand pays at the least
+    results = {
+        'python': start(['-c', 'pass'], repeat),
+        'numpy': start(['-c', 'import numpy'], repeat),
+    }
+    for entry_point, module, command in subcommands():
+        results[' '.join([entry_point] + command)] = start(['-c', _RUNNER, module] + command, repeat)
+
+    report = {
+        'config': {'repeat': repeat},
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'bytecode_cache': not sys.dont_write_bytecode and 'PYTHONDONTWRITEBYTECODE' not in os.environ},
+        'results': results,
+    }
+    encoded = json.dumps(report, indent=2)
+    if outfile:
+        with open(outfile, 'w') as stream:
+            stream.write(encoded)
+    else:
+        print(encoded)
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
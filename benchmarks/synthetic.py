@@ -0,0 +1,42 @@
+import typing
+import numpy as np
+
+from hearthstone import catalogue
+from hearthstone import hsdata
+
+
+# Roughly the shape of the collectible pool: about 1800 cards, 40% of
+# them neutral, the rest spread over the nine classes, 1 in 6 legendary
+CARD_COUNT = 1800
+PLAYABLE = [hs_class for hs_class in hsdata.HSClass if hs_class is not hsdata.HSClass.NEUTRAL]
+RARITIES = [hsdata.Rarity.COMMON, hsdata.Rarity.RARE, hsdata.Rarity.EPIC, hsdata.Rarity.LEGENDARY]
+RARITY_WEIGHTS = [0.45, 0.25, 0.13, 0.17]
+
+
+def card_catalogue(count: int = CARD_COUNT, seed: int = 0) -> catalogue.CardCatalogue:
+    random = np.random.RandomState(seed)
+    neutral = random.rand(count) < 0.4
+    hs_class = np.where(neutral, hsdata.HSClass.NEUTRAL.value,
+                        np.array([hs_class.value for hs_class in PLAYABLE])[random.randint(len(PLAYABLE), size=count)])
+    rarity = np.array([rarity.value for rarity in RARITIES])[random.choice(len(RARITIES), size=count, p=RARITY_WEIGHTS)]
+    # Real dbfIds are sparse, so leave gaps between them
+    db_id = np.sort(random.choice(np.arange(1, count * 30), size=count, replace=False))
+    # Mostly cheap cards, tailing off towards 10 mana
+    cost = np.minimum(random.poisson(3.5, size=count), 10)
+    return catalogue.CardCatalogue(db_id, hs_class, rarity, np.array([f'Card {i}' for i in db_id]), cost)
+
+
+def deck_ids(cards: catalogue.CardCatalogue, count: int, deck_size: int = 30,
+             seed: int = 0) -> typing.List[typing.Tuple[hsdata.HSClass, np.ndarray]]:
+    random = np.random.RandomState(seed)
+    legendary = cards.rarity == hsdata.Rarity.LEGENDARY.value
+    decks = []
+    for _ in range(count):
+        hs_class = PLAYABLE[random.randint(len(PLAYABLE))]
+        rows = np.flatnonzero((cards.hs_class == hs_class.value) | (cards.hs_class == hsdata.HSClass.NEUTRAL.value))
+        # Every card offered twice unless legendary, decks skew towards popular cards
+        rows = np.concatenate([rows, rows[~legendary[rows]]])
+        weights = 1.0 / (1 + np.argsort(random.rand(len(rows))))
+        picked = random.choice(rows, size=deck_size, replace=False, p=weights / weights.sum())
+        decks.append((hs_class, np.sort(cards.db_id[picked])))
+    return decks
@@ -1,85 +1,75 @@
-import enum
-import itertools
-import json
 import typing
-import urllib.request
-import urllib.parse
-from lxml import html, etree
-import requests
-import base64
 
-from hearthstone import deck
 from hearthstone import card
 from hearthstone import hsdata
-
-
-class ReplayAPI:
-
-    @classmethod
-    def deck_from_url(cls, url: str) -> typing.Optional[deck.Deck]:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) ' + \
-                          'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36'
-        }
-
-        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as request:
-            document = html.parse(request)
-
-        deck_info = document.xpath("body/div[@id = 'deck-info']")[0]
-        cards = filter(lambda card: card, [HearthstoneAPI.card_from_id(int(id)) for id in deck_info.attrib['data-deck-cards'].split(',')])
-
-        hs_class = getattr(hsdata.HSClass, deck_info.attrib['data-deck-class'])
-
-        return deck.Deck(cards, hs_class)
-
-
-class HearthpwnAPI:
-
-    @classmethod
-    def deck_from_url(cls, url: str) -> typing.Optional[deck.Deck]:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) ' + \
-                          'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36'
-        }
-
-        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as request:
-            document = html.parse(request)
-
-        # So robust
-        hs_class = getattr(hsdata.HSClass, document.xpath('body/div/div/div/div/section/header/section/span/@class')[0].split('-')[-1].upper())
-
-        card_nodes = document.xpath('body/div/div/div/div/section/div/div/aside/section/div/div/table/tbody/tr/td/b/a')
-        cards = []
-
-        for card_node in card_nodes:
-            for _ in range(int(card_node.attrib['data-count'])):
-                cards.append(HearthstoneAPI.card_from_id(int(card_node.attrib['data-id'])))
-
-        return deck.Deck(cards, hs_class)
+from hearthstone import cache
+from hearthstone import metrics
+from hearthstone import catalogue as hs_catalogue
 
 
 class HearthstoneAPI:
 
-    _CARDS = None
+    _CATALOGUE = None
+    _ENDPOINT = 'https://api.hearthstonejson.com/v1/latest/enUS/cards.collectible.json'
+    _TIMEOUT = 30.0
+    OFFLINE = cache.offline()
 
     @classmethod
     def _get_cards(cls) -> None:
-        endpoint = 'https://api.hearthstonejson.com/v1/latest/enUS/cards.collectible.json'
-        with requests.get(endpoint) as r:
-            cards = r.json()
+        with metrics.timer('cards.cache'):
+            cached = cache.read(cache.cache_path())
+        if cached is not None:
+            cls._CATALOGUE = cached[1]
+        elif cls.OFFLINE:
+            raise RuntimeError(f'No card cache at {cache.cache_path()} and offline mode is on')
+        else:
+            cls.refresh()
 
-        cls._CARDS = {
-            dict_card['dbfId']: card.Card(
-                db_id=dict_card['dbfId'],
-                hs_class=getattr(hsdata.HSClass, dict_card['playerClass']),
-                rarity=getattr(hsdata.Rarity, dict_card['rarity']),
-                name=dict_card['name'],
-            ) for dict_card in cards
-        }
+    @classmethod
+    @metrics.timed('cards.download')
+    def refresh(cls, force: bool = False) -> bool:
+        # Imported here, reading the card cache should not pay for loading requests
+        import requests
+
+        if cls.OFFLINE:
+            raise RuntimeError('Cannot refresh the card cache in offline mode')
+
+        path = cache.cache_path()
+        cached = None if force else cache.read(path)
+
+        # Revalidate against what the cache was built from
+        headers = {}
+        if cached is not None:
+            meta = cached[0]
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        with requests.get(cls._ENDPOINT, headers=headers, timeout=cls._TIMEOUT) as r:
+            if cached is not None and r.status_code == 304:
+                cls._CATALOGUE = cached[1]
+                return False
+            r.raise_for_status()
+            metrics.count('cards.bytes', len(r.content))
+            cards = hs_catalogue.CardCatalogue.from_cards(
+                card.Card(
+                    db_id=dict_card['dbfId'],
+                    hs_class=getattr(hsdata.HSClass, dict_card['playerClass']),
+                    rarity=getattr(hsdata.Rarity, dict_card['rarity']),
+                    name=dict_card['name'],
+                    cost=dict_card.get('cost', 0),
+                ) for dict_card in r.json()
+            )
+            meta = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+
+        cache.write(path, cards, meta)
+        cls._CATALOGUE = cards
+        return True
 
     def lazy_cards(func):
         def decorated(*args, **kwargs):
-            if HearthstoneAPI._CARDS is None:
+            if HearthstoneAPI._CATALOGUE is None:
                 HearthstoneAPI._get_cards()
             return func(*args, **kwargs)
         return decorated
@@ -87,9 +77,14 @@ class HearthstoneAPI:
     @classmethod
     @lazy_cards
     def card_from_id(cls, card_id: int) -> typing.Optional[card.Card]:
-        return cls._CARDS.get(card_id)
+        return cls._CATALOGUE.card_from_id(card_id)
+
+    @classmethod
+    @lazy_cards
+    def all_cards(cls) -> typing.List[card.Card]:
+        return cls._CATALOGUE.all_cards()
 
     @classmethod
     @lazy_cards
-    def all_cards(cls) -> typing.Set[card.Card]:
-        return cls._CARDS.values()
+    def catalogue(cls) -> hs_catalogue.CardCatalogue:
+        return cls._CATALOGUE
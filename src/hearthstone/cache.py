@@ -0,0 +1,46 @@
+import json
+import os
+import typing
+import numpy as np
+
+from hearthstone import catalogue
+from hearthstone import files
+
+
+CACHE_VERSION = 2
+
+
+def cache_path() -> str:
+    if os.environ.get('HS_DECKGEN_CARD_CACHE'):
+        return os.environ['HS_DECKGEN_CARD_CACHE']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'hs_deckgen', 'cards.npz')
+
+
+def offline() -> bool:
+    return os.environ.get('HS_DECKGEN_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def read(path: str) -> typing.Optional[typing.Tuple[typing.Dict[str, typing.Any], catalogue.CardCatalogue]]:
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as archive:
+        meta = json.loads(str(archive['meta']))
+        # Caches written by another layout are as good as missing
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        return meta, catalogue.CardCatalogue(**{name: archive[name]
+                                                for name in ('db_id', 'hs_class', 'rarity', 'name', 'cost')})
+
+
+def write(path: str, cards: catalogue.CardCatalogue, meta: typing.Dict[str, typing.Any]) -> None:
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    arrays = dict(cards.arrays())
+    arrays['meta'] = np.array(json.dumps(dict(meta, version=CACHE_VERSION)))
+
+    # Readers never see a partial cache
+    with files.atomic_write(path) as stream:
+        np.savez(stream, **arrays)
@@ -7,6 +7,7 @@ class _Card(typing.NamedTuple):
     hs_class: hsdata.HSClass
     rarity: hsdata.Rarity
     name: str
+    cost: int = 0
 
 
 class Card(_Card):
@@ -22,6 +23,7 @@ class Card(_Card):
             hs_class=getattr(hsdata.HSClass, json['hs_class']),
             rarity=getattr(hsdata.Rarity, json['rarity']),
             name=json['name'],
+            cost=json.get('cost', 0),
         )
 
     def to_json(self) -> typing.Dict[str, typing.Any]:
@@ -30,4 +32,5 @@ class Card(_Card):
             'hs_class': self.hs_class.name,
             'rarity': self.rarity.name,
             'name': self.name,
+            'cost': self.cost,
         }
@@ -0,0 +1,65 @@
+import typing
+import numpy as np
+
+from hearthstone import card
+from hearthstone import hsdata
+
+
+# Struct-of-arrays card catalogue, row i of every array describes one card.
+# Card tuples are only built for the cards that are actually asked for.
+class CardCatalogue:
+
+    def __init__(self, db_id: np.ndarray, hs_class: np.ndarray, rarity: np.ndarray, name: np.ndarray,
+                 cost: typing.Optional[np.ndarray] = None) -> None:
+        self.db_id = np.asarray(db_id, dtype=np.int32)
+        self.hs_class = np.asarray(hs_class, dtype=np.uint8)
+        self.rarity = np.asarray(rarity, dtype=np.uint8)
+        self.name = np.asarray(name, dtype=np.str_)
+        self.cost = np.zeros(len(self.db_id), dtype=np.uint8) if cost is None else np.asarray(cost, dtype=np.uint8)
+
+        # Dense dbfId -> row lookup, -1 for ids that aren't collectible
+        self.row_of = np.full(self.db_id.max() + 1 if len(self.db_id) else 0, -1, dtype=np.int32)
+        self.row_of[self.db_id] = np.arange(len(self.db_id), dtype=np.int32)
+        self._cards: typing.Dict[int, card.Card] = {}
+
+    @classmethod
+    def from_cards(cls, cards: typing.Iterable[card.Card]) -> 'CardCatalogue':
+        cards = list(cards)
+        return cls(
+            db_id=np.array([sub_card.db_id for sub_card in cards], dtype=np.int32),
+            hs_class=np.array([sub_card.hs_class.value for sub_card in cards], dtype=np.uint8),
+            rarity=np.array([sub_card.rarity.value for sub_card in cards], dtype=np.uint8),
+            name=np.array([sub_card.name for sub_card in cards], dtype=np.str_),
+            cost=np.array([sub_card.cost for sub_card in cards], dtype=np.uint8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.db_id)
+
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        return {'db_id': self.db_id, 'hs_class': self.hs_class, 'rarity': self.rarity, 'name': self.name,
+                'cost': self.cost}
+
+    def rows(self, db_ids: np.ndarray) -> np.ndarray:
+        db_ids = np.asarray(db_ids)
+        rows = np.full(db_ids.shape, -1, dtype=np.int32)
+        known = (db_ids >= 0) & (db_ids < len(self.row_of))
+        rows[known] = self.row_of[db_ids[known]]
+        return rows
+
+    def card_from_id(self, db_id: int) -> typing.Optional[card.Card]:
+        if db_id not in self._cards:
+            row = self.rows(np.array([db_id]))[0]
+            if row < 0:
+                return None
+            self._cards[db_id] = card.Card(
+                db_id=int(self.db_id[row]),
+                hs_class=hsdata.HSClass(int(self.hs_class[row])),
+                rarity=hsdata.Rarity(int(self.rarity[row])),
+                name=str(self.name[row]),
+                cost=int(self.cost[row]),
+            )
+        return self._cards[db_id]
+
+    def all_cards(self) -> typing.List[card.Card]:
+        return [self.card_from_id(int(db_id)) for db_id in self.db_id]
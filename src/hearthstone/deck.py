@@ -1,13 +1,14 @@
 import enum
 import typing
 import json
-import urllib.request
-from lxml import html, etree
 import base64
+import numpy as np
 
 
+from hearthstone import api
 from hearthstone import card
 from hearthstone import hsdata
+from hearthstone import metrics
 
 
 class DeckSerialization(enum.Enum):
@@ -58,6 +59,131 @@ def to_varint(i: int) -> bytes:
     return b''.join(buffer)
 
 
+def _varint_lengths(values: np.ndarray) -> np.ndarray:
+    return 1 + sum((values >> (7 * k) > 0).astype(np.int64) for k in range(1, 10))
+
+
+def _encode_varints(values: np.ndarray) -> bytes:
+    values = np.asarray(values, dtype=np.int64)
+    lengths = _varint_lengths(values)
+    starts = np.cumsum(lengths) - lengths
+
+    # One output byte per (value, 7-bit group), continuation bit on all but the last group
+    owner = np.repeat(np.arange(len(values)), lengths)
+    group = np.arange(int(lengths.sum())) - starts[owner]
+    out = (values[owner] >> (7 * group)) & 0x7f
+    out |= (group < lengths[owner] - 1).astype(np.int64) << 7
+    return out.astype(np.uint8).tobytes()
+
+
+def _decode_varints(data: bytes) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64)
+
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    group = np.arange(ends[-1] + 1) - np.repeat(starts, ends - starts + 1)
+    return np.add.reduceat((raw[:ends[-1] + 1] & 0x7f) << (7 * group), starts)
+
+
+def _deck_values(hero: int, card_ids: np.ndarray) -> np.ndarray:
+    ids, counts = np.unique(np.asarray(card_ids, dtype=np.int64), return_counts=True)
+    singles = ids[counts == 1]
+    doubles = ids[counts == 2]
+    many = counts > 2
+    return np.concatenate([
+        [0, 1, 1, 1, hero, len(singles)], singles,
+        [len(doubles)], doubles,
+        [np.count_nonzero(many)], np.column_stack([ids[many], counts[many]]).ravel(),
+    ]).astype(np.int64)
+
+
+@metrics.timed('deck.encode')
+def encode_deck_codes(heroes: typing.Sequence[int], decks: typing.Sequence[np.ndarray]) -> typing.List[str]:
+    values = [_deck_values(hero, card_ids) for hero, card_ids in zip(heroes, decks)]
+    if not values:
+        return []
+
+    # Encode every deck's varints in one go, then cut the bytes back apart
+    flat = np.concatenate(values)
+    encoded = _encode_varints(flat)
+    lengths = np.add.reduceat(_varint_lengths(flat), np.cumsum([0] + [len(deck_values) for deck_values in values[:-1]]))
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [base64.b64encode(encoded[start:stop]).decode('utf-8') for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+@metrics.timed('deck.decode')
+def try_decode_deck_codes(codes: typing.Iterable[str]) -> typing.List[typing.Optional[typing.Tuple[int, np.ndarray]]]:
+    # Like decode_deck_codes, but codes that don't decode come back as None
+    raw = []
+    for code in codes:
+        try:
+            raw.append(base64.b64decode(code))
+        except ValueError:
+            raw.append(b'')
+    # A code has to end on the last byte of a varint, or its tail would run into the next code's first value
+    complete = [bool(data) and data[-1] < 0x80 for data in raw]
+
+    joined = b''.join(data for data, ok in zip(raw, complete) if ok)
+    values = _decode_varints(joined)
+    # Each code's values end at the last terminator byte before its own end
+    terminators = np.flatnonzero(np.frombuffer(joined, dtype=np.uint8) < 0x80)
+    value_ends = iter(np.searchsorted(terminators, np.cumsum([len(data) for data, ok in zip(raw, complete) if ok])))
+
+    decoded: typing.List[typing.Optional[typing.Tuple[int, np.ndarray]]] = []
+    start = 0
+    for ok in complete:
+        if not ok:
+            decoded.append(None)
+            continue
+        stop = next(value_ends)
+        try:
+            decoded.append(_parse_deck_values(values[start:stop]))
+        except ValueError:
+            decoded.append(None)
+        start = stop
+    return decoded
+
+
+def decode_deck_codes(codes: typing.Iterable[str]) -> typing.List[typing.Tuple[int, np.ndarray]]:
+    codes = list(codes)
+    decoded = []
+    for code, values in zip(codes, try_decode_deck_codes(codes)):
+        if values is None:
+            raise ValueError(f'Not a deck code: {code!r}')
+        decoded.append(values)
+    return decoded
+
+
+def _parse_deck_values(values: np.ndarray) -> typing.Tuple[int, np.ndarray]:
+    if len(values) < 4 or values[0] != 0:
+        raise ValueError('Not a deck code')
+
+    heroes = int(values[3])
+    position = 4 + heroes
+    hero = int(values[4]) if heroes else 0
+
+    sections = []
+    for copies in (1, 2):
+        count = int(values[position]) if position < len(values) else -1
+        if count < 0 or position + 1 + count > len(values):
+            raise ValueError('Deck code ends early')
+        sections.append(np.repeat(values[position + 1:position + 1 + count], copies))
+        position += 1 + count
+
+    # Older codes end before the n-copy section
+    if position < len(values):
+        count = int(values[position])
+        pairs = values[position + 1:position + 1 + 2 * count]
+        position += 1 + 2 * count
+        if position != len(values):
+            raise ValueError('Deck code ends early' if position > len(values) else 'Deck code has trailing values')
+        sections.append(np.repeat(pairs[0::2], pairs[1::2]))
+
+    return hero, np.concatenate(sections)
+
+
 class Deck(_Deck):
 
     @classmethod
@@ -79,7 +205,11 @@ class Deck(_Deck):
 
     @classmethod
     def from_deck_code(cls, code: str) -> 'Deck':
-        raise NotImplementedError()
+        (hero, card_ids), = decode_deck_codes([code])
+        cards = [api.HearthstoneAPI.card_from_id(int(card_id)) for card_id in card_ids]
+        if None in cards:
+            raise ValueError('Deck code contains unknown cards')
+        return cls.from_cards(cards, _HSREPLAY_TO_CLASS.get(hero))
 
 
     @classmethod
@@ -115,29 +245,8 @@ class Deck(_Deck):
         return doubles
 
     def to_deck_code(self) -> str:
-        deck_code_list = [0, 1, 1]
-        deck_code_list.append(1)
-        deck_code_list.append(_CLASS_TO_DB.get(self.hs_class))
-
-        unique = self.unique
-        doubles = self.doubles
-        singles = unique - doubles
-
-        deck_code_list.append(len(singles))
-        db_key = lambda card: card.db_id
-
-        for card in sorted(singles, key=db_key):
-            deck_code_list.append(card.db_id)
-
-        deck_code_list.append(len(doubles))
-        for card in sorted(doubles, key=db_key):
-            deck_code_list.append(card.db_id)
-
-        deck_code_list.append(0)
-        deck_code = b''.join(map(to_varint, deck_code_list))
-
-        encoded = base64.b64encode(deck_code)
-        return encoded.decode("utf-8")
+        card_ids = np.array([card.db_id for card in self.cards], dtype=np.int64)
+        return encode_deck_codes([_CLASS_TO_DB.get(self.hs_class)], [card_ids])[0]
 
     def __iter__(self):
         for card in self.cards:
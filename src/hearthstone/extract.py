@@ -0,0 +1,72 @@
+import typing
+from lxml import etree
+
+from hearthstone import metrics
+
+
+# Deck pages are large but the deck itself sits in a few nodes, so these
+# walk the parse events, drop every element once it has been closed and
+# stop as soon as the needed nodes have been seen.
+
+_HEARTHPWN_CLASS_PATH = ('html', 'body', 'div', 'div', 'div', 'div', 'section', 'header', 'section', 'span')
+_HEARTHPWN_CARD_PATH = ('html', 'body', 'div', 'div', 'div', 'div', 'section', 'div', 'div', 'aside', 'section',
+                        'div', 'div', 'table', 'tbody', 'tr', 'td', 'b', 'a')
+_HEARTHPWN_ASIDE_DEPTH = _HEARTHPWN_CARD_PATH.index('aside') + 1
+_CHUNK = 8192
+
+
+def _events(content: bytes) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+    # Feed in small chunks so that stopping early also skips the parsing
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    for offset in range(0, len(content) + _CHUNK, _CHUNK):
+        if offset < len(content):
+            parser.feed(content[offset:offset + _CHUNK])
+        else:
+            parser.close()
+        for event, element in parser.read_events():
+            yield event, element
+            if event == 'end':
+                element.clear()
+                # Closed siblings are never looked at again either
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+
+@metrics.timed('parse')
+def replay_deck_info(content: bytes) -> typing.Tuple[str, typing.List[int]]:
+    depth = 0
+    for event, element in _events(content):
+        if event == 'end':
+            depth -= 1
+            continue
+        depth += 1
+        # Only direct children of body, like body/div[@id = 'deck-info']
+        if depth == 3 and element.tag == 'div' and element.get('id') == 'deck-info':
+            return element.get('data-deck-class'), [int(id) for id in element.get('data-deck-cards').split(',')]
+
+    raise ValueError('No deck-info node in page')
+
+
+@metrics.timed('parse')
+def hearthpwn_deck_info(content: bytes) -> typing.Tuple[str, typing.List[typing.Tuple[int, int]]]:
+    path: typing.List[str] = []
+    hs_class = None
+    cards: typing.List[typing.Tuple[int, int]] = []
+
+    for event, element in _events(content):
+        if event == 'start':
+            path.append(element.tag)
+            if hs_class is None and tuple(path) == _HEARTHPWN_CLASS_PATH and element.get('class'):
+                hs_class = element.get('class').split('-')[-1].upper()
+            elif tuple(path) == _HEARTHPWN_CARD_PATH:
+                cards.append((int(element.get('data-id')), int(element.get('data-count'))))
+            continue
+
+        path.pop()
+        # The deck lists all sit in one aside, nothing after it matters
+        if cards and hs_class is not None and len(path) == _HEARTHPWN_ASIDE_DEPTH - 1 and element.tag == 'aside':
+            break
+
+    if hs_class is None:
+        raise ValueError('No class node in page')
+    return hs_class, cards
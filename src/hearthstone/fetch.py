@@ -0,0 +1,111 @@
+import collections
+import concurrent.futures
+import threading
+import time
+import typing
+import urllib.parse
+import requests
+from requests import adapters
+
+from hearthstone import metrics
+
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) ' + \
+                  'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36'
+}
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+T = typing.TypeVar('T')
+U = typing.TypeVar('U')
+
+
+class Fetched(typing.NamedTuple):
+    url: str
+    content: typing.Optional[bytes]
+    error: typing.Optional[Exception]
+
+
+class Fetcher:
+
+    def __init__(self, concurrency: int = 8, host_interval: float = 0.0, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 30.0) -> None:
+        self.concurrency = concurrency
+        self.host_interval = host_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        # One keep-alive pool per host, sized so every worker can hold a connection
+        self._session = requests.Session()
+        self._session.headers.update(HEADERS)
+        adapter = adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._next_request: typing.Dict[str, float] = {}
+
+    def _wait_for_host(self, url: str) -> None:
+        if self.host_interval <= 0:
+            return
+
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, now))
+            self._next_request[host] = start + self.host_interval
+        time.sleep(start - now)
+
+    @metrics.timed('fetch')
+    def fetch(self, url: str) -> bytes:
+        for attempt in range(self.retries + 1):
+            self._wait_for_host(url)
+            metrics.count('fetch.requests')
+            try:
+                response = self._session.get(url, timeout=self.timeout)
+                if response.status_code not in _RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    metrics.count('fetch.bytes', len(response.content))
+                    return response.content
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+        raise AssertionError('unreachable')
+
+    def _fetch_result(self, url: str) -> Fetched:
+        try:
+            return Fetched(url, self.fetch(url), None)
+        except requests.RequestException as ex:
+            return Fetched(url, None, ex)
+
+    def fetch_many(self, urls: typing.Iterable[str]) -> typing.Iterator[Fetched]:
+        return self.map(self._fetch_result, urls)
+
+    def map(self, function: typing.Callable[[U], T], urls: typing.Iterable[U]) -> typing.Iterator[T]:
+        # Results come back in input order, with a bounded number in flight
+        # so that a long URL stream is never read far ahead
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as executor:
+            pending: typing.Deque[concurrent.futures.Future] = collections.deque()
+            for url in urls:
+                pending.append(executor.submit(function, url))
+                if len(pending) >= 2 * self.concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_DEFAULT: typing.Optional[Fetcher] = None
+
+
+def default_fetcher() -> Fetcher:
+    global _DEFAULT  # pylint: disable=global-statement
+    if _DEFAULT is None:
+        _DEFAULT = Fetcher()
+    return _DEFAULT
@@ -0,0 +1,21 @@
+import contextlib
+import os
+import tempfile
+import typing
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, sync: bool = True) -> typing.Iterator[typing.BinaryIO]:
+    # Written beside the target and renamed over it, so readers and crashes only ever see
+    # the old file or the whole new one. sync=False skips the fsync for files that are only a cache.
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as stream:
+            yield stream
+            if sync:
+                stream.flush()
+                os.fsync(stream.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,101 @@
+import contextlib
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import typing
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+
+# Process-wide stage timers and counters. Recording is a lock and a couple
+# of additions, cheap enough to leave on for every run and in the server.
+
+_LOCK = threading.Lock()
+_STAGES: typing.Dict[str, typing.List[float]] = {}
+_COUNTERS: typing.Dict[str, int] = {}
+_START = time.perf_counter()
+
+F = typing.TypeVar('F', bound=typing.Callable[..., typing.Any])
+
+
+def record(stage: str, seconds: float) -> None:
+    with _LOCK:
+        totals = _STAGES.setdefault(stage, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+
+def count(counter: str, amount: int = 1) -> None:
+    with _LOCK:
+        _COUNTERS[counter] = _COUNTERS.get(counter, 0) + amount
+
+
+@contextlib.contextmanager
+def timer(stage: str) -> typing.Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> typing.Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def decorated(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return typing.cast(F, decorated)
+    return decorator
+
+
+def start_tracing() -> None:
+    # Python-level peak memory, numpy reports its buffers to tracemalloc too
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def reset() -> None:
+    with _LOCK:
+        _STAGES.clear()
+        _COUNTERS.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.clear_traces()
+
+
+def snapshot() -> typing.Dict[str, typing.Any]:
+    with _LOCK:
+        report: typing.Dict[str, typing.Any] = {
+            'stages': {stage: {'calls': int(calls), 'seconds': seconds}
+                       for stage, (calls, seconds) in sorted(_STAGES.items())},
+            'counters': dict(sorted(_COUNTERS.items())),
+            'wall_seconds': time.perf_counter() - _START,
+        }
+
+    memory = {}
+    if tracemalloc.is_tracing():
+        memory['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    if resource is not None:
+        # ru_maxrss is in kilobytes, except on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        memory['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    report['memory'] = memory
+    return report
+
+
+def write_report(path: typing.Optional[str] = None) -> None:
+    encoded = json.dumps(snapshot(), indent=2)
+    if path:
+        with open(path, 'w') as stream:
+            stream.write(encoded + '\n')
+    else:
+        sys.stderr.write(encoded + '\n')
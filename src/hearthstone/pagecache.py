@@ -0,0 +1,104 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import typing
+
+from hearthstone import files
+from hearthstone import metrics
+
+
+class PageCache:
+
+    PAGE = '.html'
+    DECK = '.json'
+
+    def __init__(self, directory: str, ttl: typing.Optional[float] = None, max_bytes: typing.Optional[int] = None,
+                 decks_only: bool = False) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Keep just the extracted class and card ids instead of whole pages
+        self.decks_only = decks_only
+
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Path -> size, least recently used first: evicting never scans the directory again
+        self._used: 'collections.OrderedDict[str, int]' = collections.OrderedDict(
+            (path, size) for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2]))
+        self._size = sum(self._used.values())
+
+    def _path(self, url: str, kind: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + kind)
+
+    def _entries(self) -> typing.Iterator[typing.Tuple[str, int, float]]:
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith((self.PAGE, self.DECK)):
+                        stat = entry.stat()
+                        yield entry.path, stat.st_size, stat.st_atime
+
+    def _read(self, path: str) -> typing.Optional[bytes]:
+        try:
+            modified = os.path.getmtime(path)
+            if self.ttl is not None and time.time() - modified > self.ttl:
+                return None
+            with open(path, 'rb') as stream:
+                content = stream.read()
+        except FileNotFoundError:
+            metrics.count('pagecache.misses')
+            return None
+
+        metrics.count('pagecache.hits')
+        # Access time tracks use for eviction, modification time stays the fetch time for the TTL
+        os.utime(path, (time.time(), modified))
+        with self._lock:
+            if path in self._used:
+                self._used.move_to_end(path)
+        return content
+
+    def _write(self, path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            # Only a cache, not worth an fsync
+            with files.atomic_write(path, sync=False) as stream:
+                stream.write(content)
+            self._size += len(content) - self._used.pop(path, 0)
+            self._used[path] = len(content)
+        self.evict()
+
+    def evict(self) -> None:
+        if self.max_bytes is None:
+            return
+
+        with self._lock:
+            while self._size > self.max_bytes and self._used:
+                path, size = self._used.popitem(last=False)
+                self._size -= size
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def get_page(self, url: str) -> typing.Optional[bytes]:
+        return self._read(self._path(url, self.PAGE))
+
+    def put_page(self, url: str, content: bytes) -> None:
+        if not self.decks_only:
+            self._write(self._path(url, self.PAGE), content)
+
+    def get_deck(self, url: str) -> typing.Optional[typing.Tuple[str, typing.List[int]]]:
+        content = self._read(self._path(url, self.DECK))
+        if content is None:
+            return None
+        extracted = json.loads(content.decode('utf-8'))
+        return extracted['hs_class'], extracted['cards']
+
+    def put_deck(self, url: str, hs_class: str, cards: typing.List[int]) -> None:
+        if self.decks_only:
+            encoded = json.dumps({'hs_class': hs_class, 'cards': cards}).encode('utf-8')
+            self._write(self._path(url, self.DECK), encoded)
@@ -0,0 +1,104 @@
+import abc
+import logging
+import typing
+import urllib.parse
+import requests
+
+from hearthstone import api
+from hearthstone import deck
+from hearthstone import hsdata
+from hearthstone import extract
+from hearthstone import fetch
+from hearthstone import pagecache
+
+
+# Deck page scraping, kept out of hearthstone.api so that generating decks
+# never loads requests or lxml
+
+_LOG = logging.getLogger(__name__)
+
+
+class _DeckScraper(abc.ABC):
+
+    @classmethod
+    @abc.abstractmethod
+    def deck_info(cls, content: bytes) -> typing.Tuple[str, typing.List[int]]:
+        pass
+
+    @classmethod
+    def deck_from_html(cls, content: bytes) -> deck.Deck:
+        class_name, card_ids = cls.deck_info(content)
+        cards = list(filter(lambda card: card, [api.HearthstoneAPI.card_from_id(id) for id in card_ids]))
+
+        hs_class = getattr(hsdata.HSClass, class_name)
+
+        return deck.Deck(cards, hs_class)
+
+    @classmethod
+    def deck_from_url(cls, url: str, fetcher: typing.Optional[fetch.Fetcher] = None,
+                      page_cache: typing.Optional[pagecache.PageCache] = None) -> typing.Optional[deck.Deck]:
+        if page_cache is not None:
+            extracted = page_cache.get_deck(url)
+            if extracted is not None:
+                hs_class, card_ids = extracted
+                return deck.Deck([api.HearthstoneAPI.card_from_id(card_id) for card_id in card_ids],
+                                 getattr(hsdata.HSClass, hs_class))
+
+            content = page_cache.get_page(url)
+            if content is not None:
+                return cls.deck_from_html(content)
+
+        content = (fetcher or fetch.default_fetcher()).fetch(url)
+        parsed = cls.deck_from_html(content)
+        if page_cache is not None:
+            page_cache.put_page(url, content)
+            page_cache.put_deck(url, parsed.hs_class.name, [card.db_id for card in parsed.cards if card])
+        return parsed
+
+    @classmethod
+    def _try_deck_from_url(cls, url: str, fetcher: fetch.Fetcher,
+                           page_cache: typing.Optional[pagecache.PageCache]) -> typing.Optional[deck.Deck]:
+        try:
+            return cls.deck_from_url(url, fetcher, page_cache)
+        except requests.RequestException as ex:
+            _LOG.warning('Skipping %s: %s', url, ex)
+        except (IndexError, KeyError, AttributeError, ValueError) as ex:
+            _LOG.warning('Skipping %s: could not parse deck (%s)', url, ex)
+        return None
+
+    @classmethod
+    def decks_from_urls(cls, urls: typing.Iterable[str], fetcher: typing.Optional[fetch.Fetcher] = None,
+                        page_cache: typing.Optional[pagecache.PageCache] = None) -> typing.Iterator[deck.Deck]:
+        fetcher = fetcher or fetch.default_fetcher()
+        for parsed in fetcher.map(lambda url: cls._try_deck_from_url(url, fetcher, page_cache), urls):
+            if parsed is not None:
+                yield parsed
+
+
+class ReplayAPI(_DeckScraper):
+
+    @classmethod
+    def deck_info(cls, content: bytes) -> typing.Tuple[str, typing.List[int]]:
+        return extract.replay_deck_info(content)
+
+
+class HearthpwnAPI(_DeckScraper):
+
+    @classmethod
+    def deck_info(cls, content: bytes) -> typing.Tuple[str, typing.List[int]]:
+        # So robust
+        class_name, card_counts = extract.hearthpwn_deck_info(content)
+
+        card_ids = []
+
+        for card_id, count in card_counts:
+            for _ in range(count):
+                card_ids.append(card_id)
+
+        return class_name, card_ids
+
+
+def scraper_for(url: str) -> typing.Type[_DeckScraper]:
+    if urllib.parse.urlsplit(url).netloc.endswith('hearthpwn.com'):
+        return HearthpwnAPI
+    return ReplayAPI
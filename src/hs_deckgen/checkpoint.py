@@ -0,0 +1,67 @@
+import os
+import time
+import typing
+
+from hs_deckgen import model as hs_model
+
+
+if typing.TYPE_CHECKING:
+    from hs_deckgen import pipeline as hs_pipeline  # pylint: disable=unused-import
+
+
+class Checkpoint:
+
+    def __init__(self, path: str, interval: float = 300.0, keep_urls: bool = False) -> None:
+        self.path = path
+        self.interval = interval
+        # Inputs read in a fixed order resume from a line count, crawled
+        # URLs come back in a different order every run so they are kept
+        self.keep_urls = keep_urls
+        self.cursor = 0
+        self.urls: typing.Set[str] = set()
+        self._last = time.monotonic()
+
+    @classmethod
+    def resume(cls, path: str, interval: float = 300.0,
+               keep_urls: bool = False) -> typing.Tuple[hs_model.HSModel, 'Checkpoint']:
+        checkpoint = cls(path, interval, keep_urls)
+        with open(path, 'rb') as stream:
+            model = hs_model.HSModel.load(stream)
+        state = model.meta.pop('checkpoint', {})
+        checkpoint.cursor = state.get('cursor', 0)
+        checkpoint.urls = set(state.get('urls', []))
+        return model, checkpoint
+
+    def remaining(self, records: typing.Iterable['hs_pipeline.Record']) -> typing.Iterator['hs_pipeline.Record']:
+        for record in records:
+            if self.keep_urls:
+                if record.url not in self.urls:
+                    yield record
+            elif record.position >= self.cursor:
+                yield record
+
+    def done(self, record: 'hs_pipeline.Record') -> None:
+        self.cursor = record.position + 1
+        if self.keep_urls and record.url is not None:
+            self.urls.add(record.url)
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last >= self.interval
+
+    def save(self, model: hs_model.HSModel) -> None:
+        state: typing.Dict[str, typing.Any] = {'cursor': self.cursor}
+        if self.keep_urls:
+            state['urls'] = sorted(self.urls)
+        model.meta['checkpoint'] = state
+
+        try:
+            model.save_file(self.path)
+        finally:
+            del model.meta['checkpoint']
+        self._last = time.monotonic()
+
+    def remove(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 import json
+import os
 import typing
 import sys
 import click
@@ -7,8 +8,14 @@ from hearthstone import deck
 from hearthstone import card
 from hearthstone import hsdata
 from hearthstone import api
+from hearthstone import metrics
 
+from hs_deckgen import constraints as hs_constraints
 from hs_deckgen import model as hs_model
+from hs_deckgen import storage as hs_storage
+
+# Fetching (requests, lxml) and serving (asyncio) are imported by the commands
+# that use them, so that generating a deck only loads numpy and the model
 
 
 @contextmanager
@@ -27,15 +34,43 @@ def io_or_std(path: typing.Optional[str], mode: str = 'r') -> typing.IO:
             yield sys.stdin.buffer
 
 @click.group()
-def main() -> None:
-    pass
+@click.option('--offline', is_flag=True, default=False, help='Only use the cached card catalogue')
+@click.option('--profile', is_flag=True, default=False, help='Report per-stage timings, counters and peak memory')
+@click.option('--profile-out', type=click.Path(dir_okay=False), required=False,
+              help='Write the report here, not stderr')
+@click.pass_context
+def main(ctx: click.Context, offline: bool, profile: bool, profile_out: typing.Optional[str]) -> None:
+    if offline:
+        api.HearthstoneAPI.OFFLINE = True
+    if profile:
+        metrics.reset()
+        metrics.start_tracing()
+        ctx.call_on_close(lambda: metrics.write_report(profile_out))
+
+
+def _curve(_ctx: click.Context, _param: click.Parameter,
+           value: typing.Optional[str]) -> typing.Optional[typing.List[int]]:
+    if not value:
+        return None
+    try:
+        curve = [int(count) for count in value.split(',')]
+    except ValueError:
+        raise click.BadParameter(f'{value!r} is not a comma separated list of card counts')
+    if len(curve) > hs_constraints.CURVE_BUCKETS or min(curve) < 0:
+        raise click.BadParameter(f'expected at most {hs_constraints.CURVE_BUCKETS} counts, none negative')
+    return curve
 
 @main.command()
 @click.option('--model', type=click.Path(exists=True), required=True)
 @click.option('--hsclass', type=str, required=False)
 @click.option('--partial', type=click.Path(exists=True))
 @click.option('--output', type=click.Path(), required=False)
-def deck(model: str, hsclass: str, partial: str, output: str) -> None:
+@click.option('--beam', type=int, required=False, help='Beam search over this many partial decks')
+@click.option('--curve', callback=_curve, required=False, help='Most cards at costs 0,1,...,6,7+ e.g. 2,6,6,5,4,3,2,2')
+@click.option('--max-legendary', type=int, required=False)
+@click.option('--singleton', is_flag=True, default=False, help='One copy of every card')
+def deck(model: str, hsclass: str, partial: str, output: str, beam: typing.Optional[int],
+         curve: typing.Optional[typing.List[int]], max_legendary: typing.Optional[int], singleton: bool) -> None:
 
     with open(model, 'rb') as model_in, io_or_std(partial, 'r') as partial_in, io_or_std(output, 'w') as out:
         partial = [api.HearthstoneAPI.card_from_id(id) for id in json.load(partial_in)]
@@ -51,8 +86,16 @@ def deck(model: str, hsclass: str, partial: str, output: str) -> None:
         else:
             hs_class = getattr(hsdata.HSClass, hsclass)
 
-        mod = hs_model.HSModel.load(model_in)
-        deck = mod.generate_deck(partial, hs_class)
+        mod = hs_model.HSModel.load(model_in, mmap_mode='r')
+        if beam or curve or max_legendary is not None or singleton:
+            constraints = hs_constraints.Constraints(
+                curve=curve,
+                rarity_caps={hsdata.Rarity.LEGENDARY: max_legendary} if max_legendary is not None else None,
+                singleton=singleton,
+            )
+            deck = mod.generate_beam(partial, hs_class, constraints, beam or 8)[0]
+        else:
+            deck = mod.generate_deck(partial, hs_class)
         deck.save(out)
         print()
 
@@ -60,14 +103,179 @@ def deck(model: str, hsclass: str, partial: str, output: str) -> None:
 @click.option('--outfile', type=click.Path(exists=False), required=False)
 @click.option('--training', type=click.Path(exists=True), required=False)
 @click.option('--train/--notrain', default=True)
-def model(outfile, training, train) -> None:
+@click.option('--storage', type=click.Choice(sorted(hs_storage.STORAGES)), default='dense')
+@click.option('--dtype', type=click.Choice(['float64', 'float32', 'uint32', 'uint16']), default='float64',
+              help='Type the deck counts are kept in, integer types fail loudly on overflow')
+@click.option('--processes', type=int, required=False)
+@click.option('--concurrency', type=int, default=8, help='Deck pages fetched at once')
+@click.option('--host-interval', type=float, default=0.0, help='Minimum seconds between requests to one host')
+@click.option('--cache-dir', type=click.Path(file_okay=False), required=False, help='Cache scraped deck pages here')
+@click.option('--cache-ttl', type=float, required=False, help='Seconds before a cached page is refetched')
+@click.option('--cache-max-bytes', type=int, required=False)
+@click.option('--cache-decks-only', is_flag=True, default=False, help='Cache extracted decks instead of pages')
+@click.option('--batch-size', type=int, default=256, help='Decks per matrix update')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), required=False,
+              help='Periodically save progress here, defaults to OUTFILE.checkpoint')
+@click.option('--checkpoint-interval', type=float, default=300.0, help='Seconds between checkpoints')
+@click.option('--resume', is_flag=True, default=False, help='Continue from the last checkpoint')
+def model(outfile, training, train, storage, dtype, processes, concurrency, host_interval,
+          cache_dir, cache_ttl, cache_max_bytes, cache_decks_only, batch_size,
+          checkpoint_path, checkpoint_interval, resume) -> None:
+    from hearthstone import fetch
+    from hearthstone import pagecache
+    from hs_deckgen import checkpoint as hs_checkpoint
+    from hs_deckgen import pipeline as hs_pipeline
+
+    if checkpoint_path is None and outfile:
+        checkpoint_path = f'{outfile}.checkpoint'
+    if resume and not (checkpoint_path and os.path.exists(checkpoint_path)):
+        raise click.UsageError('--resume needs an existing checkpoint')
+    if resume and processes and processes > 1:
+        raise click.UsageError('--resume can not be used with --processes')
+
     if train:
-        with io_or_std(training, 'r') as fin, io_or_std(outfile, 'wb') as fout:
-            deck_locations = json.load(fin)
-            decks = (deck.Deck.from_hsreplay(deck_url) for deck_url in deck_locations)
-            mod = hs_model.HSModel.from_decks(decks)
+        with io_or_std(training, 'r') as fin:
+            records = hs_pipeline.read_records(fin)
+            fetcher = fetch.Fetcher(concurrency, host_interval)
+            page_cache = None
+            if cache_dir:
+                page_cache = pagecache.PageCache(cache_dir, cache_ttl, cache_max_bytes, cache_decks_only)
+            checkpoint = None
+            if processes and processes > 1:
+                ids = (card_ids for _, card_ids in hs_pipeline.decks(records, fetcher, page_cache)
+                       if card_ids is not None)
+                mod = hs_model.HSModel.from_ids(ids, storage, processes, dtype=dtype)
+            else:
+                if resume:
+                    mod, checkpoint = hs_checkpoint.Checkpoint.resume(checkpoint_path, checkpoint_interval)
+                else:
+                    mod = hs_model.HSModel(storage, dtype=dtype)
+                    if checkpoint_path:
+                        checkpoint = hs_checkpoint.Checkpoint(checkpoint_path, checkpoint_interval)
+                hs_pipeline.TrainingPipeline(mod, fetcher, page_cache, batch_size).run(records, checkpoint)
+
+        with io_or_std(outfile, 'wb') as fout:
             mod.save(fout)
+        if checkpoint is not None:
+            checkpoint.remove()
     else:
         with io_or_std(outfile, 'wb') as fout:
-            mod = hs_model.HSModel()
+            mod = hs_model.HSModel(storage, dtype=dtype)
             mod.save(fout)
+
+
+@main.command()
+@click.option('--model', 'model_path', type=click.Path(exists=True, dir_okay=False), required=True)
+@click.option('--decks', type=click.Path(exists=True), required=False,
+              help='JSON lines of URLs or deck codes to add, {"remove": ...} to remove')
+@click.option('--log', 'log_path', type=click.Path(dir_okay=False), required=False,
+              help='Decks included in the model, defaults to MODEL.log')
+@click.option('--concurrency', type=int, default=8, help='Deck pages fetched at once')
+@click.option('--host-interval', type=float, default=0.0, help='Minimum seconds between requests to one host')
+@click.option('--cache-dir', type=click.Path(file_okay=False), required=False, help='Cache scraped deck pages here')
+def update(model_path, decks, log_path, concurrency, host_interval, cache_dir) -> None:
+    from hearthstone import fetch
+    from hearthstone import pagecache
+    from hs_deckgen import pipeline as hs_pipeline
+    from hs_deckgen import update as hs_update
+
+    log = hs_update.DeckLog(log_path or f'{model_path}.log')
+    fetcher = fetch.Fetcher(concurrency, host_interval)
+    page_cache = pagecache.PageCache(cache_dir) if cache_dir else None
+    with io_or_std(decks, 'r') as fin:
+        delta = hs_update.update_file(model_path, log, hs_pipeline.read_records(fin), fetcher, page_cache)
+    print(f'{delta.added} added, {delta.removed} removed, {delta.skipped} skipped', file=sys.stderr)
+
+
+@main.command(help='Write a smaller copy of a model that generates decks but can not be trained')
+@click.option('--model', 'model_path', type=click.Path(exists=True, dir_okay=False), required=True)
+@click.option('--outfile', type=click.Path(exists=False), required=False)
+@click.option('--dtype', type=click.Choice(['float16', 'float32']), default='float16')
+def normalize(model_path, outfile, dtype) -> None:
+    with open(model_path, 'rb') as model_in:
+        mod = hs_model.HSModel.load(model_in, mmap_mode='r')
+
+    with io_or_std(outfile, 'wb') as fout:
+        mod.normalized(dtype).save(fout)
+
+
+@main.command()
+@click.option('--outfile', type=click.Path(exists=False), required=False)
+@click.argument('models', type=click.Path(exists=True), nargs=-1, required=True)
+def merge(outfile, models) -> None:
+    partials = []
+    for path in models:
+        with open(path, 'rb') as model_in:
+            partials.append(hs_model.HSModel.load(model_in))
+
+    with io_or_std(outfile, 'wb') as fout:
+        hs_model.HSModel.merge(*partials).save(fout)
+
+
+@main.command()
+@click.option('--infile', type=click.Path(exists=True), required=False)
+@click.option('--outfile', type=click.Path(exists=False), required=False)
+def convert(infile, outfile) -> None:
+    with io_or_std(infile, 'rb') as fin:
+        mod = hs_model.HSModel.load(fin)
+
+    with io_or_std(outfile, 'wb') as fout:
+        mod.save(fout)
+
+
+@main.command()
+@click.option('--model', 'models', type=str, multiple=True, required=True,
+              help='Model file to serve, optionally named as NAME=PATH')
+@click.option('--host', type=str, default='127.0.0.1')
+@click.option('--port', type=int, default=8000)
+@click.option('--socket', 'unix_socket', type=click.Path(), required=False)
+def serve(models, host, port, unix_socket) -> None:
+    from hs_deckgen import server as hs_server
+
+    loaded = {}
+    for spec in models:
+        name, _, path = spec.rpartition('=')
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as model_in:
+            loaded[name] = hs_model.HSModel.load(model_in, mmap_mode='r')
+
+    # Warm the card catalogue before the first request needs it
+    api.HearthstoneAPI.all_cards()
+    hs_server.DeckServer(loaded).serve_forever(host, port, unix_socket)
+
+@main.command()
+@click.option('--host', type=str, default='127.0.0.1')
+@click.option('--port', type=int, default=8000)
+@click.option('--socket', 'unix_socket', type=click.Path(exists=True), required=False)
+@click.option('--model', type=str, required=False)
+@click.option('--hsclass', type=str, required=False)
+@click.option('--partial', type=click.Path(exists=True))
+@click.option('--count', type=int, default=1)
+@click.option('--seed', type=int, required=False)
+@click.option('--output', type=click.Path(), required=False)
+@click.option('--metrics', 'show_metrics', is_flag=True, default=False, help="Print the server's counters instead")
+def client(host, port, unix_socket, model, hsclass, partial, count, seed, output, show_metrics) -> None:
+    import http.client
+    from hs_deckgen import server as hs_server
+
+    if unix_socket:
+        connection = hs_server.UnixHTTPConnection(unix_socket)
+    else:
+        connection = http.client.HTTPConnection(host, port)
+
+    if show_metrics:
+        with io_or_std(output, 'w') as out:
+            out.write(json.dumps(hs_server.request_metrics(connection), indent=2) + '\n')
+        return
+
+    with io_or_std(partial, 'r') as partial_in, io_or_std(output, 'w') as out:
+        codes = hs_server.request_decks(connection, json.load(partial_in), hsclass, count, model, seed)
+        for code in codes:
+            out.write(code + '\n')
+
+
+@main.command()
+@click.option('--force', is_flag=True, default=False, help='Download even if the cache is current')
+def cards(force: bool) -> None:
+    changed = api.HearthstoneAPI.refresh(force)
+    click.echo(f'{len(api.HearthstoneAPI.all_cards())} cards, {"updated" if changed else "already current"}')
@@ -0,0 +1,66 @@
+import typing
+import numpy as np
+
+from hearthstone import hsdata
+
+
+# Mana costs 0 to 6 get a bucket each, everything from 7 up shares the last one
+CURVE_BUCKETS = 8
+
+
+class Constraints(typing.NamedTuple):
+    # Most cards allowed at each cost bucket
+    curve: typing.Optional[typing.Sequence[int]] = None
+    # Most cards allowed of each rarity
+    rarity_caps: typing.Optional[typing.Dict[hsdata.Rarity, int]] = None
+    # One copy of every card, not just of legendaries
+    singleton: bool = False
+
+    @classmethod
+    def from_json(cls, json: typing.Dict[str, typing.Any]) -> 'Constraints':
+        rarity_caps = json.get('rarity_caps')
+        if rarity_caps:
+            rarity_caps = {getattr(hsdata.Rarity, name): cap for name, cap in rarity_caps.items()}
+        return cls(
+            curve=json.get('curve'),
+            rarity_caps=rarity_caps or None,
+            singleton=bool(json.get('singleton', False)),
+        )
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'curve': list(self.curve) if self.curve is not None else None,
+            'rarity_caps': {rarity.name: cap for rarity, cap in self.rarity_caps.items()} if self.rarity_caps else None,
+            'singleton': self.singleton,
+        }
+
+
+class SlotMasks(typing.NamedTuple):
+    bucket: np.ndarray
+    rarity: np.ndarray
+    curve_caps: np.ndarray
+    rarity_caps: np.ndarray
+    # Slots no deck may use whatever else it holds
+    banned: np.ndarray
+
+
+def slot_masks(constraints: Constraints, cost: np.ndarray, rarity: np.ndarray, copies: np.ndarray,
+               deck_size: int) -> SlotMasks:
+    # Per-slot attributes and caps, so a whole beam is checked with a few array lookups
+    curve_caps = np.full(CURVE_BUCKETS, deck_size, dtype=np.intp)
+    if constraints.curve is not None:
+        curve_caps[:len(constraints.curve)] = constraints.curve
+
+    rarity_caps = np.full(max(rarity_value.value for rarity_value in hsdata.Rarity) + 1, deck_size, dtype=np.intp)
+    for rarity_value, cap in (constraints.rarity_caps or {}).items():
+        rarity_caps[rarity_value.value] = cap
+
+    legendary = rarity == hsdata.Rarity.LEGENDARY.value
+    banned = (copies > 0) & (legendary | constraints.singleton)
+    return SlotMasks(
+        bucket=np.minimum(cost, CURVE_BUCKETS - 1).astype(np.intp),
+        rarity=rarity.astype(np.intp),
+        curve_caps=curve_caps,
+        rarity_caps=rarity_caps,
+        banned=banned,
+    )
@@ -1,16 +1,66 @@
+import copy
 import io
 import itertools
+import json
+import multiprocessing
+import os
 import pickle
+import struct
+import tempfile
 import typing
 import numpy as np
-import requests
 
 from hearthstone import hsdata
 from hearthstone import deck
 from hearthstone import card
 from hearthstone import api
+from hearthstone import catalogue as hs_catalogue
+from hearthstone import files
+from hearthstone import metrics
 
+from hs_deckgen import constraints as hs_constraints
+from hs_deckgen import storage as hs_storage
 
+
+# Model file layout: magic, version and header size, a JSON header
+# describing the arrays, then each array's raw bytes at an
+# aligned offset so that load() can memory map them in place
+_MAGIC = b'HSMODEL\x00'
+_VERSION = 2
+_PREAMBLE = struct.Struct('<II')
+_ALIGN = 64
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _read_into(stream: typing.IO[bytes], buffer: typing.Any) -> None:
+    view = memoryview(buffer).cast('B')
+    while view:
+        read = stream.readinto(view)
+        if not read:
+            raise ValueError('Unexpected end of model file')
+        view = view[read:]
+
+
+# A deck as card ids, a list or an array
+CardIds = typing.Union[np.ndarray, typing.Sequence[int]]
+
+
+class _Beam(typing.NamedTuple):
+    # One row per partial deck of a beam search
+    excluded: np.ndarray
+    totals: np.ndarray
+    bucket_counts: np.ndarray
+    rarity_counts: np.ndarray
+    scores: np.ndarray
+    hashes: np.ndarray
+    picks: np.ndarray
+
+
+# No longer used by HSModel, kept so pickled models from before the
+# array layout can still be unpickled and converted
 L = typing.TypeVar('L')
 R = typing.TypeVar('R')
 class BijectiveMap():
@@ -42,69 +92,242 @@ class BijectiveMap():
 
 class HSModel:
 
-    def __init__(self):
-        cards = api.HearthstoneAPI.all_cards()
-
-        self._class_indexs = {hsdata.HSClass.NEUTRAL: []}
-        self._map = _map = BijectiveMap()
-        count = 0
-
-        for i, card in enumerate(cards):
-            for idx in range(1 + (card.rarity is not hsdata.Rarity.LEGENDARY)):
-                self._class_indexs.setdefault(card.hs_class, []).append(count)
-                _map[(card.db_id, idx)] = count
-                count += 1
-
-        self._model = np.zeros([count, count])
-        self._norm = np.ones([count])
-
-
-    def _deck_to_rows(self, deck: typing.List[card.Card]) -> typing.List[int]:
-        keyfunc = lambda card: card.db_id
-        cards = sorted(deck, key=keyfunc)
-        return [self._map.left[(sub_db_id, sub_count)]
-                for sub_db_id, sub_group in itertools.groupby(cards, key=keyfunc)
-                for sub_count, _ in enumerate(sub_group)]
+    def __init__(self, storage: str = 'dense',
+                 cards: typing.Union[None, hs_catalogue.CardCatalogue, typing.Iterable[card.Card]] = None,
+                 dtype: typing.Any = np.float64) -> None:
+        if cards is None:
+            cards = api.HearthstoneAPI.catalogue()
+        elif not isinstance(cards, hs_catalogue.CardCatalogue):
+            cards = hs_catalogue.CardCatalogue.from_cards(cards)
+
+        # Every card gets a slot per copy a deck may hold, in catalogue order
+        copies = 1 + (cards.rarity != hsdata.Rarity.LEGENDARY.value)
+        first = np.cumsum(copies) - copies
+        slot_db_id = np.repeat(cards.db_id, copies)
+        slot_copy = np.arange(len(slot_db_id)) - np.repeat(first, copies)
+        self._set_layout(slot_db_id, slot_copy, np.repeat(cards.hs_class, copies))
+
+        count = len(slot_db_id)
+        # Counts are integers, so uint32 or even uint16 holds them in a fraction of the memory
+        self._model: hs_storage.Storage = hs_storage.STORAGES[storage](count, dtype)
+        self._norm = np.ones([count], dtype=dtype)
+        # Counts divided by their column norms, see normalized()
+        self._normalized = False
+        self._class_cache: typing.Dict[hsdata.HSClass, typing.Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        # Free-form JSON saved in the file header, e.g. training checkpoints
+        self.meta: typing.Dict[str, typing.Any] = {}
+
+    def _set_layout(self, slot_db_id: np.ndarray, slot_copy: np.ndarray, slot_class: np.ndarray) -> None:
+        self._slot_db_id = np.asarray(slot_db_id, dtype=np.int32)
+        self._slot_copy = np.asarray(slot_copy, dtype=np.uint8)
+        self._slot_class = np.asarray(slot_class, dtype=np.uint8)
+
+        # Dense dbfId -> slot of its first copy, the other copies follow it
+        self._first_slot = np.full(self._slot_db_id.max() + 1 if len(self._slot_db_id) else 0, -1, dtype=np.int32)
+        first_copies = np.flatnonzero(self._slot_copy == 0)
+        self._first_slot[self._slot_db_id[first_copies]] = first_copies
+
+    def _deck_to_rows(self, deck: typing.Iterable[card.Card]) -> np.ndarray:
+        return self._ids_to_rows(np.array([sub_card.db_id for sub_card in deck], dtype=np.intp))
+
+    def _ids_to_rows(self, db_ids: CardIds, deck_index: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        # Several decks at once when deck_index tells which deck each id is from,
+        # the rows come back sorted by deck, then by card
+        db_ids = np.asarray(db_ids, dtype=np.intp)
+        if deck_index is None:
+            deck_index = np.zeros(len(db_ids), dtype=np.intp)
+        order = np.lexsort((db_ids, deck_index))
+        db_ids, deck_index = db_ids[order], deck_index[order]
+        # The nth copy of a card is its position after the card's first occurrence in its deck
+        positions = np.arange(len(db_ids))
+        first = np.ones(len(db_ids), dtype=bool)
+        first[1:] = (db_ids[1:] != db_ids[:-1]) | (deck_index[1:] != deck_index[:-1])
+        copies = positions - np.maximum.accumulate(np.where(first, positions, 0))
+
+        known = (db_ids >= 0) & (db_ids < len(self._first_slot))
+        rows = np.full(len(db_ids), -1, dtype=np.intp)
+        rows[known] = self._first_slot[db_ids[known]]
+        rows[rows >= 0] += copies[rows >= 0]
+
+        valid = (rows >= 0) & (rows < len(self._slot_db_id))
+        valid[valid] = self._slot_db_id[rows[valid]] == db_ids[valid]
+        if not valid.all():
+            invalid = np.flatnonzero(~valid)[0]
+            raise KeyError((int(db_ids[invalid]), int(copies[invalid])))
+        return rows
 
+    @property
+    def dtype(self) -> np.dtype:
+        return self._norm.dtype
+
+    def _check_update(self, slots: typing.Any, increment: np.ndarray) -> None:
+        if self._normalized:
+            raise ValueError('A normalized model can only generate decks, train the model it was made from')
+        # No count is larger than its slot's norm, so checking the norms covers the whole matrix
+        if np.issubdtype(self._norm.dtype, np.integer) and len(increment):
+            updated = self._norm[slots].astype(np.int64) + increment
+            limits = np.iinfo(self._norm.dtype)
+            if updated.max() > limits.max or updated.min() < limits.min:
+                raise OverflowError(f'Deck counts no longer fit in {self._norm.dtype}, use a wider dtype')
+
+    @metrics.timed('model.train')
     def train(self, deck: typing.List[card.Card]):
-        rows = np.array(self._deck_to_rows(deck))
-        self._model[rows[:, None], rows] += len(rows)
+        rows = self._deck_to_rows(deck)
+        self._check_update(rows, np.full(len(rows), len(rows), dtype=np.int64))
+        self._model.add(rows, len(rows))
         self._norm[rows] += len(rows)
+        self._changed()
+        metrics.count('model.decks_trained')
+
+    def _batch_to_rows(self, batch: typing.List[CardIds]) -> typing.Tuple[np.ndarray, np.ndarray]:
+        # The rows of every deck in the batch, one after the other, and the deck sizes
+        sizes = np.array([len(card_ids) for card_ids in batch], dtype=np.intp)
+        db_ids = np.concatenate([np.asarray(card_ids, dtype=np.intp) for card_ids in batch])
+        return self._ids_to_rows(db_ids, np.repeat(np.arange(len(batch)), sizes)), sizes
+
+    def train_many(self, decks: typing.Iterable[typing.List[card.Card]], batch_size: int = 1024) -> None:
+        self.train_ids(([sub_card.db_id for sub_card in deck] for deck in decks), batch_size)
+
+    def train_codes(self, codes: typing.Iterable[str], batch_size: int = 1024) -> typing.List[str]:
+        # Codes that don't decode or hold cards the model doesn't know are skipped, and returned
+        skipped = []
+        codes = iter(codes)
+        while True:
+            batch = list(itertools.islice(codes, batch_size))
+            if not batch:
+                break
+            rows = []
+            for code, decoded in zip(batch, deck.try_decode_deck_codes(batch)):
+                try:
+                    if decoded is not None:
+                        rows.append(self._ids_to_rows(decoded[1]))
+                        continue
+                except KeyError:
+                    pass
+                skipped.append(code)
+            if rows:
+                self._train_batch(np.concatenate(rows), np.array([len(deck_rows) for deck_rows in rows]))
+        metrics.count('model.decks_skipped', len(skipped))
+        return skipped
+
+    def train_ids(self, decks: typing.Iterable[CardIds], batch_size: int = 1024) -> None:
+        decks = iter(decks)
+        while True:
+            batch = list(itertools.islice(decks, batch_size))
+            if not batch:
+                break
+            self._train_batch(*self._batch_to_rows(batch))
+
+    def untrain_ids(self, decks: typing.Iterable[CardIds], batch_size: int = 1024) -> None:
+        # Exactly undoes train_ids for decks that were trained before
+        decks = iter(decks)
+        while True:
+            batch = list(itertools.islice(decks, batch_size))
+            if not batch:
+                break
+            self._train_batch(*self._batch_to_rows(batch), weight=-1)
+
+    def playable(self, card_ids: CardIds) -> bool:
+        # Whether train_ids takes the deck, every card and copy of it has a slot
+        try:
+            self._ids_to_rows(card_ids)
+        except KeyError:
+            return False
+        return True
+
+    def backup_rows(self, decks: typing.Iterable[CardIds]) -> typing.Dict[str, np.ndarray]:
+        # Every count that training or untraining decks can change, for restore_rows to put back
+        rows = [self._ids_to_rows(card_ids) for card_ids in decks]
+        slots = np.unique(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.intp)
+        return {'slots': slots, 'block': np.array(self._model.take_rows(slots, slots)),
+                'norm': np.array(self._norm[slots])}
+
+    def restore_rows(self, backup: typing.Dict[str, np.ndarray]) -> None:
+        slots, block = backup['slots'], backup['block']
+        # Added as a difference, storages only support adding; integer counts subtract exactly
+        difference = np.int64 if np.issubdtype(block.dtype, np.integer) else np.float64
+        self._model.add(slots, np.subtract(block, self._model.take_rows(slots, slots), dtype=difference))
+        self._norm[slots] = backup['norm']
+        self._changed()
+
+    @metrics.timed('model.train')
+    def _train_batch(self, flat: np.ndarray, sizes: np.ndarray, weight: int = 1) -> None:
+        # flat holds the rows of every deck, one deck after the other. Every pair of slots
+        # sharing a deck is counted, both ways round and each slot with itself: each slot is
+        # repeated once per slot of its deck and paired with each of them in turn
+        repeats = np.repeat(sizes, sizes)
+        rows = np.repeat(flat, repeats)
+        runs = np.cumsum(repeats) - repeats
+        deck_starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        columns = flat[np.repeat(deck_starts - runs, repeats) + np.arange(len(rows))]
+
+        increment = np.bincount(flat, weights=np.repeat(weight * sizes, sizes), minlength=len(self._norm))
+        increment = increment.astype(np.int64)
+        self._check_update(slice(None), increment)
+        # Each pair counts once per deck, weighted by the deck's size as in train()
+        self._model.add_pairs(rows, columns, np.repeat(weight * repeats, repeats))
+        self._norm += increment.astype(self._norm.dtype)
+        self._changed()
+        metrics.count('model.decks_trained' if weight > 0 else 'model.decks_removed', len(sizes))
+
+    def _changed(self) -> None:
+        self._class_cache.clear()
+
+    def _class_columns(self, hs_class: hsdata.HSClass) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Slots a hs_class deck may use, with their norms and copy numbers, built on first use
+        if hs_class not in self._class_cache:
+            allowed = (self._slot_class == hs_class.value) | (self._slot_class == hsdata.HSClass.NEUTRAL.value)
+            columns = np.flatnonzero(allowed)
+            copies = self._slot_copy[columns].astype(np.intp)
+            self._class_cache[hs_class] = (columns, np.array(self._norm[columns]), copies)
+        return self._class_cache[hs_class]
+
+    @staticmethod
+    def _to_columns(columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        rows = np.array(rows, dtype=np.intp)
+        positions = np.searchsorted(columns, rows)
+        inside = positions < len(columns)
+        inside[inside] = columns[positions[inside]] == rows[inside]
+        return positions[inside]
+
+    @staticmethod
+    def _tie_break(scores: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        # Each row's best column, a uniform choice among tied ones: the row's draw picks which to take
+        ties = scores == np.max(scores, axis=1, keepdims=True)
+        tie_counts = np.count_nonzero(ties, axis=1)
+        index = np.argmax(ties, axis=1)
+        tied = np.flatnonzero(tie_counts > 1)
+        if len(tied):
+            nth = (draws[tied] * tie_counts[tied]).astype(np.intp)
+            index[tied] = np.argmax(np.cumsum(ties[tied], axis=1) > nth[:, None], axis=1)
+        return index
 
     #TODO - Other constraints (mana, stats, etc)
     #FIXME - Normalization still not right
+    @metrics.timed('model.generate')
     def generate_deck(self, partial: typing.List[card.Card], hs_class: hsdata.HSClass, deck_size=30):
         assert len(partial) >= 0
         assert len(partial) <= deck_size
 
-        class_indexs = self._class_indexs.copy()
-        class_indexs.pop(hs_class)
-        class_indexs.pop(hsdata.HSClass.NEUTRAL)
-
-        model = self._model / self._norm
-        for indexs in class_indexs.values():
-            model[:,indexs] = -1
-        np.fill_diagonal(model, -1)
-
-        generated_deck = []
-        generated_deck.extend(partial)
-
-        # import pdb; pdb.set_trace()
-        model[:, self._deck_to_rows(generated_deck)] = -1
-        chosen = set()
+        columns, norm, copies = self._class_columns(hs_class)
+        rows = self._deck_to_rows(partial)
+        generated_deck = list(partial)
+        excluded = np.zeros(len(columns), dtype=bool)
+        excluded[self._to_columns(columns, rows)] = True
+        # Running co-occurrence totals, each pick only adds its own row
+        totals = self._model.sum_rows(rows, columns)
 
         for _ in range(deck_size - len(generated_deck)):
-            rows = self._deck_to_rows(generated_deck)
-            combined = np.sum(model[rows], axis=0)
+            combined = totals / norm
+            combined[excluded] = -2
             index = np.random.choice(np.argwhere(combined == np.max(combined)).ravel())
-            card_id, n = self._map.right[index]
+            card_id = int(self._slot_db_id[columns[index]])
 
-            if n and index-1 not in chosen:
-                model[:,index-1] = -1
-                chosen.add(index-1)
-            else:
-                model[:,index] = -1
-                chosen.add(index)
+            # Copies of a card always fill its lowest free slot
+            if self._slot_copy[columns[index]] and not excluded[index-1]:
+                index -= 1
+            excluded[index] = True
+            totals += self._model.sum_rows([columns[index]], columns)
 
             card = api.HearthstoneAPI.card_from_id(card_id)
 
@@ -113,17 +336,354 @@ class HSModel:
 
         return deck.Deck(generated_deck, hs_class)
 
+    @metrics.timed('model.generate')
+    def generate_decks(self, partial: typing.List[card.Card], hs_class: hsdata.HSClass, n: int,
+                       seed: typing.Optional[int] = None, deck_size: int = 30) -> typing.List[deck.Deck]:
+        assert len(partial) <= deck_size
+
+        columns, norm, copies = self._class_columns(hs_class)
+        rows = self._deck_to_rows(partial)
+        decks = np.arange(n)
+        steps = deck_size - len(partial)
+
+        # Row i of one seeded draw is deck i's, so a deck doesn't depend on how many are asked for
+        draws = np.random.RandomState(seed).random_sample((n, steps))
+        scale = 1 / norm
+
+        totals = np.tile(self._model.sum_rows(rows, columns), (n, 1))
+        # Picked slots total -inf, which stays so whatever is added to them later
+        totals[:, self._to_columns(columns, rows)] = -np.inf
+        combined = np.empty_like(totals)
+        picks = np.zeros([n, steps], dtype=np.intp)
+
+        for step in range(steps):
+            np.multiply(totals, scale, out=combined)
+            index = self._tie_break(combined, draws[:, step])
+            # Copies of a card always fill its lowest free slot
+            index -= (copies[index] > 0) & (totals[decks, index - 1] != -np.inf)
+            totals[decks, index] = -np.inf
+            totals += self._model.take_rows(columns[index], columns)
+            picks[:, step] = index
+
+        return self._picks_to_decks(partial, hs_class, columns, picks)
+
+    @metrics.timed('model.generate')
+    def generate_beam(self, partial: typing.List[card.Card], hs_class: hsdata.HSClass,
+                      constraints: typing.Optional[hs_constraints.Constraints] = None, width: int = 8, n: int = 1,
+                      deck_size: int = 30) -> typing.List[deck.Deck]:
+        assert len(partial) <= deck_size
+        assert n <= width
+
+        columns, norm, copies = self._class_columns(hs_class)
+        masks = self._slot_masks(columns, copies, constraints or hs_constraints.Constraints(), deck_size)
+        # Decks reached by picking the same cards in another order hash the same
+        keys = np.random.RandomState(0).randint(2**62, size=len(columns), dtype=np.int64)
+
+        beam = self._beam_start(partial, columns, masks, keys)
+        for _ in range(deck_size - len(partial)):
+            beam = self._beam_step(beam, columns, norm, copies, masks, keys, width)
+        return self._picks_to_decks(partial, hs_class, columns, beam.picks[:n])
+
+    def _slot_masks(self, columns: np.ndarray, copies: np.ndarray, constraints: hs_constraints.Constraints,
+                    deck_size: int) -> hs_constraints.SlotMasks:
+        cards = api.HearthstoneAPI.catalogue()
+        card_rows = cards.rows(self._slot_db_id[columns])
+        if np.any(card_rows < 0):
+            missing = self._slot_db_id[columns][card_rows < 0]
+            raise ValueError(f'Cards missing from the catalogue: {sorted(set(missing.tolist()))}')
+        return hs_constraints.slot_masks(constraints, cards.cost[card_rows], cards.rarity[card_rows], copies,
+                                         deck_size)
+
+    def _beam_start(self, partial: typing.List[card.Card], columns: np.ndarray, masks: hs_constraints.SlotMasks,
+                    keys: np.ndarray) -> '_Beam':
+        # A beam of one, the given cards alone
+        rows = self._deck_to_rows(partial)
+        start = np.zeros(len(columns), dtype=bool)
+        start[self._to_columns(columns, rows)] = True
+        return _Beam(
+            excluded=start[None, :],
+            totals=self._model.sum_rows(rows, columns)[None, :],
+            bucket_counts=np.bincount(masks.bucket[start], minlength=len(masks.curve_caps))[None, :],
+            rarity_counts=np.bincount(masks.rarity[start], minlength=len(masks.rarity_caps))[None, :],
+            scores=np.zeros(1),
+            hashes=np.sum(keys[start])[None],
+            picks=np.zeros([1, 0], dtype=np.intp),
+        )
+
+    def _beam_step(self, beam: '_Beam', columns: np.ndarray, norm: np.ndarray, copies: np.ndarray,
+                   masks: hs_constraints.SlotMasks, keys: np.ndarray, width: int) -> '_Beam':
+        # A copy slot can only follow its lower copy, so a deck has one order of slots
+        previous = np.maximum(np.arange(len(columns)) - 1, 0)
+        combined = beam.totals / norm
+        invalid = beam.excluded | masks.banned \
+            | (beam.bucket_counts >= masks.curve_caps)[:, masks.bucket] \
+            | (beam.rarity_counts >= masks.rarity_caps)[:, masks.rarity] \
+            | ((copies > 0) & ~beam.excluded[:, previous])
+        combined[invalid] = -np.inf
+
+        # Each deck's best few cards, then the best of those across the whole beam
+        top = np.argpartition(-combined, min(width, len(columns)) - 1, axis=1)[:, :width]
+        parents = np.repeat(np.arange(len(beam.scores)), top.shape[1])
+        candidates = top.ravel()
+        candidate_scores = beam.scores[parents] + combined[parents, candidates]
+        candidate_hashes = beam.hashes[parents] + keys[candidates]
+
+        order = np.argsort(-candidate_scores, kind='mergesort')
+        order = order[np.isfinite(candidate_scores[order])]
+        _, first = np.unique(candidate_hashes[order], return_index=True)
+        order = order[np.sort(first)][:width]
+        if not len(order):
+            raise ValueError('No deck satisfies the constraints')
+
+        parents, chosen = parents[order], candidates[order]
+        rows = np.arange(len(order))
+        excluded = beam.excluded[parents]
+        excluded[rows, chosen] = True
+        totals = beam.totals[parents] + self._model.take_rows(columns[chosen], columns)
+        bucket_counts = beam.bucket_counts[parents]
+        bucket_counts[rows, masks.bucket[chosen]] += 1
+        rarity_counts = beam.rarity_counts[parents]
+        rarity_counts[rows, masks.rarity[chosen]] += 1
+        return _Beam(excluded, totals, bucket_counts, rarity_counts, candidate_scores[order], candidate_hashes[order],
+                     np.column_stack([beam.picks[parents], chosen]))
+
+    def _picks_to_decks(self, partial: typing.List[card.Card], hs_class: hsdata.HSClass, columns: np.ndarray,
+                        picks: np.ndarray) -> typing.List[deck.Deck]:
+        # Decks share most of their cards, look each one up once
+        picked, inverse = np.unique(picks, return_inverse=True)
+        cards = [api.HearthstoneAPI.card_from_id(int(db_id)) for db_id in self._slot_db_id[columns[picked]]]
+        return [
+            deck.Deck(list(partial) + [cards[position] for position in deck_positions], hs_class)
+            for deck_positions in inverse.reshape(picks.shape)
+        ]
+
+    @classmethod
+    def from_decks(cls, decks: typing.Iterable[deck.Deck], storage: str = 'dense',
+                   processes: typing.Optional[int] = None,
+                   cards: typing.Union[None, hs_catalogue.CardCatalogue, typing.Iterable[card.Card]] = None,
+                   dtype: typing.Any = np.float64) -> 'HSModel':
+        if not processes or processes < 2:
+            model = HSModel(storage, cards, dtype)
+            model.train_many(decks)
+            return model
+        ids = ([sub_card.db_id for sub_card in sub_deck] for sub_deck in decks)
+        return cls.from_ids(ids, storage, processes, cards, dtype)
+
     @classmethod
-    def from_decks(cls, decks: typing.Iterable[deck.Deck]) -> 'HSModel':
-        model = HSModel()
-        for deck in decks:
-            model.train(deck)
+    def from_ids(cls, decks: typing.Iterable[CardIds], storage: str = 'dense',
+                 processes: typing.Optional[int] = None,
+                 cards: typing.Union[None, hs_catalogue.CardCatalogue, typing.Iterable[card.Card]] = None,
+                 dtype: typing.Any = np.float64) -> 'HSModel':
+        if not processes or processes < 2:
+            model = HSModel(storage, cards, dtype)
+            model.train_ids(decks)
+            return model
+
+        # Workers build their layout from the same catalogue as the parent
+        if cards is None:
+            cards = api.HearthstoneAPI.catalogue()
+        elif not isinstance(cards, hs_catalogue.CardCatalogue):
+            cards = hs_catalogue.CardCatalogue.from_cards(cards)
+        # Id arrays, a fraction of the size of Card lists to keep and to send to the workers
+        shards: typing.List[typing.List[np.ndarray]] = [[] for _ in range(processes)]
+        for i, card_ids in enumerate(decks):
+            shards[i % processes].append(np.asarray(card_ids, dtype=np.int32))
+
+        # Workers save their partial models and the parent adds each one into the first as it is done.
+        # Partials are only mapped, never all held at once as returned results would be.
+        merged: typing.Optional[HSModel] = None
+        with tempfile.TemporaryDirectory() as directory, multiprocessing.Pool(processes) as pool:
+            tasks = [(storage, cards, shard, dtype, os.path.join(directory, str(i))) for i, shard in enumerate(shards)]
+            for path in pool.imap_unordered(_train_shard, tasks):
+                with open(path, 'rb') as stream:
+                    if merged is None:
+                        merged = cls.load(stream)
+                    else:
+                        partial = cls.load(stream, mmap_mode='r')
+                        merged._add_model(partial)
+                        # Unmapped before its file goes
+                        del partial
+                os.unlink(path)
+        assert merged is not None
+        return merged
+
+    def same_layout(self, other: 'HSModel') -> bool:
+        return all(
+            np.array_equal(mine, theirs) for mine, theirs in (
+                (self._slot_db_id, other._slot_db_id),
+                (self._slot_copy, other._slot_copy),
+                (self._slot_class, other._slot_class),
+            )
+        )
+
+    @classmethod
+    def merge(cls, *models: 'HSModel') -> 'HSModel':
+        if not models:
+            raise ValueError('merge requires at least one model')
+
+        first, *rest = models
+        for other in rest:
+            first._check_mergeable(other)
+
+        merged = copy.deepcopy(first)
+        for other in rest:
+            merged._add_model(other)
+        merged.meta = {}
+
+        return merged
+
+    def _check_mergeable(self, other: 'HSModel') -> None:
+        if not self.same_layout(other):
+            raise ValueError('Cannot merge models with different card layouts')
+        if self.dtype != other.dtype or other._normalized:
+            raise ValueError('Cannot merge models with different count dtypes')
+
+    def _add_model(self, other: 'HSModel') -> None:
+        # In place, merge() without the copy
+        self._check_mergeable(other)
+        self._check_update(slice(None), other._norm.astype(np.int64) - 1)
+        self._model.add_storage(other._model)
+        # Every model's norm starts from ones, only count that once
+        self._norm += other._norm - 1
+        self._changed()
+
+    @classmethod
+    def _from_parts(cls, storage: hs_storage.Storage, norm: np.ndarray, slot_db_id: np.ndarray, slot_copy: np.ndarray,
+                    slot_class: np.ndarray) -> 'HSModel':
+        model = cls.__new__(cls)
+        model._set_layout(slot_db_id, slot_copy, slot_class)
+        model._model = storage
+        model._norm = norm
+        model._class_cache = {}
+        model.meta = {}
+        model._normalized = False
+        return model
 
+    def normalized(self, dtype: typing.Any = np.float16) -> 'HSModel':
+        # Generation only ever divides summed counts by their column norms, so a
+        # copy holding the divided counts picks the same cards from far fewer bytes
+        model = self._from_parts(self._model.scaled(self._norm, dtype), np.ones(len(self._norm), dtype=dtype),
+                                 self._slot_db_id, self._slot_copy, self._slot_class)
+        model._normalized = True
         return model
 
     @classmethod
-    def load(cls, stream: typing.IO[bytes]) -> 'HSModel':
-        return pickle.load(stream)
+    def _from_legacy(cls, legacy: 'HSModel') -> 'HSModel':
+        storage = legacy._model
+        if isinstance(storage, np.ndarray):
+            storage = hs_storage.DenseStorage.from_arrays(len(storage), {'matrix': storage})
+
+        slot_class = np.zeros(len(legacy._norm), dtype=np.uint8)
+        for hs_class, indexs in legacy._class_indexs.items():
+            slot_class[list(indexs)] = hs_class.value
+
+        layout = np.array([legacy._map.right[index] for index in range(len(legacy._norm))], dtype=np.int64)
+        layout = layout.reshape(-1, 2)
+        return cls._from_parts(storage, legacy._norm, layout[:, 0], layout[:, 1], slot_class)
+
+    @classmethod
+    @metrics.timed('model.load')
+    def load(cls, stream: typing.IO[bytes], mmap_mode: typing.Optional[str] = None) -> 'HSModel':
+        prefix = stream.read(len(_MAGIC))
+        if prefix != _MAGIC:
+            # Pickled models from before the versioned format
+            return cls._from_legacy(pickle.loads(prefix + stream.read()))
+
+        version, header_size = _PREAMBLE.unpack(stream.read(_PREAMBLE.size))
+        if version != _VERSION:
+            raise ValueError(f'Unsupported model file version {version}')
+        header = json.loads(stream.read(header_size).decode('utf-8'))
+        position = len(_MAGIC) + _PREAMBLE.size + header_size
+
+        arrays = {}
+        for name, spec in sorted(header['arrays'].items(), key=lambda item: item[1]['offset']):
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            if mmap_mode and np.prod(shape):
+                arrays[name] = np.memmap(stream, dtype=dtype, mode=mmap_mode, offset=spec['offset'], shape=shape)
+            else:
+                # Read forwards only, stdin can't seek
+                stream.read(spec['offset'] - position)
+                array = np.empty(shape, dtype=dtype)
+                _read_into(stream, array)
+                arrays[name] = array
+                position = spec['offset'] + array.nbytes
+
+        size = len(arrays['norm'])
+        storage_arrays = {name.split('.', 1)[1]: array for name, array in arrays.items() if name.startswith('model.')}
+        storage = hs_storage.STORAGES[header['storage']].from_arrays(size, storage_arrays)
+
+        model = cls._from_parts(storage, arrays['norm'], arrays['slot_db_id'], arrays['slot_copy'],
+                                arrays['slot_class'])
+        model.meta = header.get('meta', {})
+        model._normalized = header.get('normalized', False)
+        return model
+
+    def save_file(self, path: str) -> None:
+        # A crash leaves the old file intact
+        with files.atomic_write(path) as stream:
+            self.save(stream)
+
+    def _mutable_arrays(self) -> typing.Iterator[np.ndarray]:
+        yield from self._model.arrays().values()
+        yield self._norm
+
+    def mapped_in_place(self) -> bool:
+        # Every array is a view of the model file and no update changes their sizes
+        return self._model.in_place and all(isinstance(array, np.memmap) or not array.size
+                                            for array in self._mutable_arrays())
+
+    def flush(self) -> None:
+        # Models loaded with mmap_mode='r+' are updated in their file, make sure it is written
+        for array in self._mutable_arrays():
+            if isinstance(array, np.memmap):
+                array.flush()
 
+    @metrics.timed('model.save')
     def save(self, stream: typing.IO[bytes]) -> None:
-        pickle.dump(self, stream)
+        arrays = {f'model.{name}': np.ascontiguousarray(array) for name, array in self._model.arrays().items()}
+        arrays['norm'] = np.ascontiguousarray(self._norm)
+        arrays['slot_db_id'] = self._slot_db_id
+        arrays['slot_copy'] = self._slot_copy
+        arrays['slot_class'] = self._slot_class
+
+        header: typing.Dict[str, typing.Any] = {
+            'storage': self._model.kind,
+            'arrays': {},
+        }
+        if self.meta:
+            header['meta'] = self.meta
+        if self._normalized:
+            header['normalized'] = True
+
+        # Offsets depend on the header size, so lay the arrays out until it stops growing
+        header_size = 0
+        while True:
+            offset = _aligned(len(_MAGIC) + _PREAMBLE.size + header_size)
+            for name, array in arrays.items():
+                header['arrays'][name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+                offset = _aligned(offset + array.nbytes)
+            encoded = json.dumps(header).encode('utf-8')
+            if len(encoded) <= header_size:
+                break
+            header_size = len(encoded)
+
+        encoded = encoded.ljust(header_size)
+        stream.write(_MAGIC)
+        stream.write(_PREAMBLE.pack(_VERSION, header_size))
+        stream.write(encoded)
+        position = len(_MAGIC) + _PREAMBLE.size + header_size
+        for name, array in arrays.items():
+            offset = header['arrays'][name]['offset']
+            stream.write(b'\x00' * (offset - position))
+            stream.write(array.data)
+            position = offset + array.nbytes
+
+
+def _train_shard(args: typing.Tuple[str, hs_catalogue.CardCatalogue, typing.List[np.ndarray], typing.Any, str]) -> str:
+    storage, cards, decks, dtype, path = args
+    model = HSModel(storage, cards, dtype)
+    model.train_ids(decks)
+    with open(path, 'wb') as stream:
+        model.save(stream)
+    return path
@@ -0,0 +1,281 @@
+import itertools
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import typing
+import numpy as np
+import requests
+
+from hearthstone import api
+from hearthstone import deck
+from hearthstone import fetch
+from hearthstone import pagecache
+from hearthstone import scrapers
+
+from hs_deckgen import checkpoint as hs_checkpoint
+from hs_deckgen import model as hs_model
+
+
+_LOG = logging.getLogger(__name__)
+
+
+class Record(typing.NamedTuple):
+    # Position in the input, what checkpoints resume from
+    position: int
+    url: typing.Optional[str]
+    code: typing.Optional[str]
+    remove: bool = False
+
+    @property
+    def key(self) -> str:
+        key = self.url if self.url is not None else self.code
+        assert key is not None, 'A record has either a URL or a deck code'
+        return key
+
+
+class Stats(typing.NamedTuple):
+    read: int
+    trained: int
+    skipped: int
+    seconds: float
+
+
+def _record(position: int, value: typing.Any) -> Record:
+    if isinstance(value, dict) and 'remove' in value:
+        return _record(position, value['remove'])._replace(remove=True)
+    if isinstance(value, dict):
+        if 'url' in value:
+            return Record(position, value['url'], None)
+        return Record(position, None, value.get('code') or value['deck_code'])
+    if value.startswith(('http://', 'https://')):
+        return Record(position, value, None)
+    return Record(position, None, value)
+
+
+def read_records(stream: typing.TextIO) -> typing.Iterator[Record]:
+    # One URL or deck code per line, either bare or as a JSON string/object.
+    # Older inputs are a single JSON list, those still have to be read whole.
+    head = stream.read(1)
+    while head and head.isspace():
+        head = stream.read(1)
+    if head == '[':
+        for position, value in enumerate(json.loads(head + stream.read())):
+            yield _record(position, value)
+        return
+
+    position = 0
+    for line in itertools.chain([head + stream.readline()], stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            value = line
+        yield _record(position, value)
+        position += 1
+
+
+class _Failed(typing.NamedTuple):
+    error: BaseException
+
+
+_DONE = object()
+
+
+class Progress:
+
+    def __init__(self, stream: typing.Optional[typing.TextIO] = sys.stderr, interval: float = 2.0) -> None:
+        self.stream = stream
+        self.interval = interval
+        self.read = 0
+        self.trained = 0
+        self.skipped = 0
+        self._start = time.monotonic()
+        self._last = self._start
+
+    def seconds(self) -> float:
+        return time.monotonic() - self._start
+
+    def _write(self, end: str) -> None:
+        if self.stream is None:
+            return
+        seconds = self.seconds()
+        rate = self.trained / seconds if seconds > 0 else 0.0
+        self.stream.write(f'\r{self.read} read, {self.trained} trained, {self.skipped} skipped, '
+                          f'{rate:.1f} decks/s{end}')
+        self.stream.flush()
+
+    def update(self) -> None:
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._write('')
+
+    def finish(self) -> Stats:
+        self._write('\n')
+        return Stats(self.read, self.trained, self.skipped, self.seconds())
+
+
+def train_batch(model: hs_model.HSModel, batch: typing.List[np.ndarray]) -> typing.List[bool]:
+    try:
+        model.train_ids(batch, len(batch))
+        return [True] * len(batch)
+    except KeyError:
+        pass
+
+    # Some deck has more copies of a card than the layout allows, find it one by one
+    trained = []
+    for card_ids in batch:
+        try:
+            model.train_ids([card_ids])
+            trained.append(True)
+        except KeyError as ex:
+            _LOG.warning('Skipping deck with unplayable cards %s', ex)
+            trained.append(False)
+    return trained
+
+
+def _stage(target: typing.Callable[[queue.Queue], None], out: queue.Queue) -> threading.Thread:
+    def run() -> None:
+        try:
+            target(out)
+        except BaseException as ex:  # pylint: disable=broad-except
+            out.put(_Failed(ex))
+        else:
+            out.put(_DONE)
+
+    # Daemon threads, a failing consumer must not be kept alive by producers blocked on a full queue
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _drain(source: queue.Queue) -> typing.Iterator[typing.Any]:
+    while True:
+        item = source.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+
+def _fetch_record(record: Record, fetcher: fetch.Fetcher,
+                  page_cache: typing.Optional[pagecache.PageCache]) -> typing.Tuple[Record, typing.Any]:
+    # Either a page to parse, an already extracted (class, ids) pair or None when skipped
+    if record.remove:
+        return record, None
+    if record.url is None:
+        return record, record.code
+    if page_cache is not None:
+        extracted = page_cache.get_deck(record.url)
+        if extracted is not None:
+            return record, extracted
+        content = page_cache.get_page(record.url)
+        if content is not None:
+            return record, content
+    try:
+        content = fetcher.fetch(record.url)
+    except requests.RequestException as ex:
+        _LOG.warning('Skipping %s: %s', record.url, ex)
+        return record, None
+    if page_cache is not None:
+        page_cache.put_page(record.url, content)
+    return record, content
+
+
+def _parse(record: Record, fetched: typing.Any,
+           page_cache: typing.Optional[pagecache.PageCache]) -> typing.Optional[np.ndarray]:
+    if fetched is None:
+        return None
+    try:
+        if isinstance(fetched, str):
+            (_, card_ids), = deck.decode_deck_codes([fetched])
+        elif isinstance(fetched, bytes):
+            url = record.key
+            hs_class, card_list = scrapers.scraper_for(url).deck_info(fetched)
+            if page_cache is not None:
+                page_cache.put_deck(url, hs_class, card_list)
+            card_ids = np.asarray(card_list)
+        else:
+            _, card_ids = fetched
+    except (IndexError, KeyError, AttributeError, ValueError) as ex:
+        _LOG.warning('Skipping %s: could not parse deck (%s)', record.key, ex)
+        return None
+
+    # Like the scrapers, cards missing from the catalogue are dropped
+    card_ids = np.asarray(card_ids, dtype=np.int32)
+    return card_ids[api.HearthstoneAPI.catalogue().rows(card_ids) >= 0]
+
+
+def decks(records: typing.Iterable[Record], fetcher: typing.Optional[fetch.Fetcher] = None,
+          page_cache: typing.Optional[pagecache.PageCache] = None,
+          queue_size: int = 512) -> typing.Iterator[typing.Tuple[Record, typing.Optional[np.ndarray]]]:
+    # reader/fetch -> parse -> caller, each hop a bounded queue so memory stays flat.
+    # Card ids come back in record order, None for records that were skipped.
+    fetcher = fetcher or fetch.default_fetcher()
+    fetched: queue.Queue = queue.Queue(queue_size)
+    parsed: queue.Queue = queue.Queue(queue_size)
+
+    def fetch_stage(out: queue.Queue) -> None:
+        for item in fetcher.map(lambda record: _fetch_record(record, fetcher, page_cache), records):
+            out.put(item)
+
+    def parse_stage(out: queue.Queue) -> None:
+        for record, content in _drain(fetched):
+            out.put((record, _parse(record, content, page_cache)))
+
+    _stage(fetch_stage, fetched)
+    _stage(parse_stage, parsed)
+    return _drain(parsed)
+
+
+class TrainingPipeline:
+
+    def __init__(self, model: hs_model.HSModel, fetcher: typing.Optional[fetch.Fetcher] = None,
+                 page_cache: typing.Optional[pagecache.PageCache] = None, batch_size: int = 256,
+                 queue_size: int = 512, progress: typing.Optional[Progress] = None) -> None:
+        self.model = model
+        self.fetcher = fetcher or fetch.default_fetcher()
+        self.page_cache = page_cache
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress = progress or Progress()
+
+    def _train(self, batch: typing.List[np.ndarray]) -> None:
+        trained = train_batch(self.model, batch)
+        self.progress.trained += sum(trained)
+        self.progress.skipped += len(trained) - sum(trained)
+
+    def run(self, records: typing.Iterable[Record],
+            checkpoint: typing.Optional[hs_checkpoint.Checkpoint] = None) -> Stats:
+        if checkpoint is not None:
+            records = checkpoint.remaining(records)
+
+        batch: typing.List[np.ndarray] = []
+        for record, card_ids in decks(records, self.fetcher, self.page_cache, self.queue_size):
+            self.progress.read += 1
+            if card_ids is None:
+                self.progress.skipped += 1
+            else:
+                batch.append(card_ids)
+            if len(batch) >= self.batch_size:
+                self._train(batch)
+                batch = []
+            self.progress.update()
+
+            if checkpoint is not None:
+                checkpoint.done(record)
+                if checkpoint.due():
+                    # Everything up to the cursor has to be in the matrix before it is saved
+                    self._train(batch)
+                    batch = []
+                    checkpoint.save(self.model)
+
+        if batch:
+            self._train(batch)
+        return self.progress.finish()
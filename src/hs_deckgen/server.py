@@ -0,0 +1,196 @@
+import asyncio
+import http.client
+import json
+import socket
+import typing
+
+from hearthstone import api
+from hearthstone import card
+from hearthstone import hsdata
+from hearthstone import metrics
+
+from hs_deckgen import constraints as hs_constraints
+from hs_deckgen import model as hs_model
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+# Generated decks are this size, so a partial deck can't hold more
+_DECK_SIZE = 30
+# Most decks or beam width one request can ask for, more would hold up the executor
+_MAX_COUNT = 100
+# Classes a deck can be generated for, neutral cards go in any of them
+_CLASSES: typing.Dict[str, hsdata.HSClass] = {
+    hs_class.name: hs_class for hs_class in hsdata.HSClass if hs_class is not hsdata.HSClass.NEUTRAL
+}
+
+
+def _integer(value: typing.Any, name: str, minimum: int, maximum: typing.Optional[int] = None) -> int:
+    # JSON true and false are ints to Python
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'{name} must be an integer')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    if maximum is not None and value > maximum:
+        raise ValueError(f'{name} must be at most {maximum}')
+    return value
+
+
+def _hs_class(class_name: typing.Any, partial: typing.List[card.Card]) -> hsdata.HSClass:
+    if class_name:
+        if not isinstance(class_name, str) or class_name not in _CLASSES:
+            raise ValueError(f'hs_class must be one of {", ".join(_CLASSES)}')
+        return _CLASSES[class_name]
+    # Otherwise the class of the partial deck's first class card
+    hs_class = next((sub_card.hs_class for sub_card in partial if sub_card.hs_class is not hsdata.HSClass.NEUTRAL),
+                    None)
+    if hs_class is None:
+        raise ValueError('hs_class is needed when no card in cards belongs to a class')
+    return hs_class
+
+
+class DeckServer:
+
+    def __init__(self, models: typing.Dict[str, hs_model.HSModel]) -> None:
+        if not models:
+            raise ValueError('DeckServer needs at least one model')
+        self._models = models
+        self._default = next(iter(models))
+
+    def generate(self, request: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        if not isinstance(request, dict):
+            raise ValueError('Expected a JSON object')
+        mod = self._models[request.get('model') or self._default]
+        card_ids = request.get('cards') or []
+        if not isinstance(card_ids, list) or len(card_ids) > _DECK_SIZE or \
+                not all(isinstance(card_id, int) and not isinstance(card_id, bool) for card_id in card_ids):
+            raise ValueError(f'cards must be a list of at most {_DECK_SIZE} card ids')
+        partial = [api.HearthstoneAPI.card_from_id(card_id) for card_id in card_ids]
+        if None in partial:
+            raise ValueError('Unknown card id')
+
+        hs_class = _hs_class(request.get('hs_class'), partial)
+        count = _integer(request.get('count', 1), 'count', 1, _MAX_COUNT)
+        seed = None if request.get('seed') is None else _integer(request['seed'], 'seed', 0)
+        beam = None if request.get('beam') is None else _integer(request['beam'], 'beam', 1, _MAX_COUNT)
+        if beam or request.get('constraints'):
+            constraints = hs_constraints.Constraints.from_json(request.get('constraints') or {})
+            width = max(beam or 8, count)
+            decks = mod.generate_beam(partial, hs_class, constraints, width, count)
+        else:
+            decks = mod.generate_decks(partial, hs_class, count, seed=seed)
+        return {'decks': [generated.to_deck_code() for generated in decks]}
+
+    async def _respond(self, method: str, path: str, body: bytes) -> typing.Tuple[int, typing.Dict[str, typing.Any]]:
+        metrics.count('server.requests')
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'Use GET'}
+            return 200, metrics.snapshot()
+        if path != '/generate':
+            return 404, {'error': f'No such endpoint {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+
+        try:
+            request = json.loads(body.decode('utf-8'))
+            # Generation is numpy bound, keep the event loop free for other connections
+            loop = asyncio.get_event_loop()
+            with metrics.timer('server.generate'):
+                return 200, await loop.run_in_executor(None, self.generate, request)
+        except (ValueError, KeyError, AttributeError) as ex:
+            metrics.count('server.errors')
+            return 400, {'error': f'{type(ex).__name__}: {ex}'}
+        except Exception as ex:  # pylint: disable=broad-except
+            # Anything else is a bug, but the client still gets an answer and the connection stays usable
+            metrics.count('server.errors')
+            return 500, {'error': f'{type(ex).__name__}: {ex}'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self._respond(method, path, body)
+
+                encoded = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(encoded)}\r\n\r\n'.encode('latin-1') + encoded
+                )
+                await writer.drain()
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self, loop: asyncio.AbstractEventLoop, host: str = '127.0.0.1', port: int = 8000,
+              unix_socket: typing.Optional[str] = None) -> asyncio.AbstractServer:
+        asyncio.set_event_loop(loop)
+        if unix_socket:
+            coroutine = asyncio.start_unix_server(self.handle, path=unix_socket)
+        else:
+            coroutine = asyncio.start_server(self.handle, host, port)
+        return loop.run_until_complete(coroutine)
+
+    def serve_forever(self, host: str = '127.0.0.1', port: int = 8000,
+                      unix_socket: typing.Optional[str] = None) -> None:
+        loop = asyncio.new_event_loop()
+        server = self.start(loop, host, port, unix_socket)
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str) -> None:
+        super().__init__('localhost')
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._path)
+
+
+def request_decks(connection: http.client.HTTPConnection, cards: typing.List[int],
+                  hs_class: typing.Optional[str] = None, count: int = 1, model: typing.Optional[str] = None,
+                  seed: typing.Optional[int] = None, beam: typing.Optional[int] = None,
+                  constraints: typing.Optional[hs_constraints.Constraints] = None) -> typing.List[str]:
+    body = json.dumps({'cards': cards, 'hs_class': hs_class, 'count': count, 'model': model, 'seed': seed, 'beam': beam,
+                       'constraints': constraints.to_json() if constraints else None})
+    connection.request('POST', '/generate', body=body, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    payload = json.loads(response.read().decode('utf-8'))
+
+    if response.status != 200:
+        raise ValueError(payload.get('error', response.reason))
+    return payload['decks']
+
+
+def request_metrics(connection: http.client.HTTPConnection) -> typing.Dict[str, typing.Any]:
+    connection.request('GET', '/metrics')
+    response = connection.getresponse()
+    payload = json.loads(response.read().decode('utf-8'))
+
+    if response.status != 200:
+        raise ValueError(payload.get('error', response.reason))
+    return payload
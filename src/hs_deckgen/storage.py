@@ -0,0 +1,377 @@
+import abc
+import typing
+import numpy as np
+
+
+def _cast(block: typing.Any, dtype: np.dtype) -> np.ndarray:
+    # Negative updates to unsigned counts wrap around to the right sum, but only when cast from integers
+    block = np.asarray(block)
+    if np.issubdtype(dtype, np.integer) and not np.issubdtype(block.dtype, np.integer):
+        block = np.rint(block).astype(np.int64)
+    return block.astype(dtype)
+
+
+# What HSModel needs of a co-occurrence matrix: a size x size table of counts,
+# only ever changed by adding symmetric blocks
+class Storage(abc.ABC):
+
+    kind: str
+    # Whether updates keep the array sizes, so a memory-mapped file can be updated as it is
+    in_place: bool
+
+    @abc.abstractmethod
+    def __init__(self, size: int, dtype: typing.Any = np.float64) -> None:
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @property
+    @abc.abstractmethod
+    def nbytes(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def add(self, slots: np.ndarray, block: typing.Any) -> None:
+        pass
+
+    # Adds values at (rows[i], columns[i]), repeated pairs adding up. Callers
+    # keep the matrix symmetric by passing every pair both ways round
+    @abc.abstractmethod
+    def add_pairs(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        pass
+
+    @abc.abstractmethod
+    def add_storage(self, other: 'Storage') -> None:
+        pass
+
+    @abc.abstractmethod
+    def row(self, index: int) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def sum_rows(self, rows: typing.Union[np.ndarray, typing.Sequence[int]],
+                 columns: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def take_rows(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def to_dense(self) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def scaled(self, scale: np.ndarray, dtype: typing.Any) -> 'Storage':
+        pass
+
+    @abc.abstractmethod
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def from_arrays(cls, size: int, arrays: typing.Dict[str, np.ndarray]) -> 'Storage':
+        pass
+
+
+class DenseStorage(Storage):
+
+    kind = 'dense'
+    in_place = True
+
+    def __init__(self, size: int, dtype: typing.Any = np.float64) -> None:
+        self.matrix = np.zeros([size, size], dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def add(self, slots: np.ndarray, block: typing.Any) -> None:
+        slots = np.asarray(slots)
+        self.matrix[slots[:, None], slots] += _cast(block, self.matrix.dtype)
+
+    def add_pairs(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        # A flat view of the matrix, which is always C-contiguous, memory-mapped or not
+        np.add.at(self.matrix.reshape(-1), rows * len(self.matrix) + columns, _cast(values, self.matrix.dtype))
+
+    def add_storage(self, other: Storage) -> None:
+        self.matrix += other.to_dense()
+
+    def row(self, index: int) -> np.ndarray:
+        return self.matrix[index]
+
+    def sum_rows(self, rows: typing.Union[np.ndarray, typing.Sequence[int]],
+                 columns: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        # Summed in float64 whatever the counts are kept in, narrow ones would overflow
+        if columns is None:
+            return np.sum(self.matrix[list(rows)], axis=0, dtype=np.float64)
+        return np.sum(self.matrix[np.ix_(list(rows), columns)], axis=0, dtype=np.float64)
+
+    def take_rows(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        # Whole rows first, then columns: both copies are contiguous, twice as fast as np.ix_
+        return self.matrix[rows][:, columns]
+
+    def to_dense(self) -> np.ndarray:
+        return self.matrix
+
+    def scaled(self, scale: np.ndarray, dtype: typing.Any) -> 'DenseStorage':
+        # Every column divided by its scale
+        storage = self.__class__.__new__(self.__class__)
+        storage.matrix = (self.matrix / scale).astype(dtype)
+        return storage
+
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        return {'matrix': self.matrix}
+
+    @classmethod
+    def from_arrays(cls, size: int, arrays: typing.Dict[str, np.ndarray]) -> 'DenseStorage':
+        if arrays['matrix'].shape != (size, size):
+            raise ValueError(f'Expected a {size}x{size} matrix, got {arrays["matrix"].shape}')
+        storage = cls.__new__(cls)
+        storage.matrix = arrays['matrix']
+        return storage
+
+
+# Most slot pairs never share a deck, so only nonzero counts are kept,
+# as a dict of rows each holding sorted column and value arrays
+class SparseStorage(Storage):
+
+    kind = 'sparse'
+    in_place = False
+
+    def __init__(self, size: int, dtype: typing.Any = np.float64) -> None:
+        self._size = size
+        self._dtype = np.dtype(dtype)
+        self._rows: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray]] = {}
+        # Loaded models keep their rows in (possibly memory-mapped) CSR
+        # arrays, a row is only copied into _rows once it is written to
+        self._csr: typing.Optional[typing.Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(indices.nbytes + data.nbytes for _, (indices, data) in self._items())
+
+    def _get_row(self, slot: int) -> typing.Optional[typing.Tuple[np.ndarray, np.ndarray]]:
+        if slot in self._rows:
+            return self._rows[slot]
+        if self._csr is not None:
+            indptr, indices, data = self._csr
+            start, stop = indptr[slot], indptr[slot + 1]
+            if start != stop:
+                return indices[start:stop], data[start:stop]
+        return None
+
+    def _items(self) -> typing.Iterator[typing.Tuple[int, typing.Tuple[np.ndarray, np.ndarray]]]:
+        if self._csr is None:
+            yield from sorted(self._rows.items(), key=lambda item: item[0])
+            return
+
+        for slot in range(self._size):
+            sub_row = self._get_row(slot)
+            if sub_row is not None:
+                yield slot, sub_row
+
+    def add(self, slots: np.ndarray, block: typing.Any) -> None:
+        slots = np.asarray(slots)
+        order = np.argsort(slots)
+        slots = slots[order]
+        block = np.broadcast_to(_cast(block, self._dtype), (len(slots), len(slots)))
+        block = block[order[:, None], order]
+
+        for slot, values in zip(slots, block):
+            nonzero = values != 0
+            self._add_row(int(slot), slots[nonzero], values[nonzero])
+
+    def add_pairs(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        if not len(rows):
+            return
+        # Each pair once, with its values summed
+        positions, inverse = np.unique(rows * self._size + columns, return_inverse=True)
+        sums = _cast(np.bincount(inverse, weights=values), self._dtype)
+        rows, columns = np.divmod(positions, self._size)
+        # Sorted by row then column, so each row's columns are one sorted run
+        bounds = np.flatnonzero(np.diff(rows)) + 1
+        for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(rows)]])):
+            self._add_row(int(rows[start]), columns[start:stop], sums[start:stop])
+
+    def add_storage(self, other: Storage) -> None:
+        if isinstance(other, SparseStorage):
+            for slot, (indices, data) in other._items():
+                self._add_row(slot, indices, data)
+        else:
+            for slot, values in enumerate(other.to_dense()):
+                nonzero = np.flatnonzero(values)
+                if nonzero.size:
+                    self._add_row(slot, nonzero, values[nonzero].astype(self._dtype))
+
+    def _add_row(self, slot: int, columns: np.ndarray, values: np.ndarray) -> None:
+        current = self._get_row(slot)
+        if current is None:
+            self._rows[slot] = (columns.astype(np.int32), values.astype(self._dtype))
+            return
+
+        indices, data = current
+        if slot not in self._rows:
+            indices, data = indices.copy(), data.copy()
+            self._rows[slot] = (indices, data)
+
+        positions = np.searchsorted(indices, columns)
+        found = positions < len(indices)
+        found[found] = indices[positions[found]] == columns[found]
+
+        data[positions[found]] += values[found]
+        if not found.all():
+            missing = ~found
+            indices = np.insert(indices, positions[missing], columns[missing])
+            data = np.insert(data, positions[missing], values[missing])
+            self._rows[slot] = (indices, data)
+
+    def row(self, index: int) -> np.ndarray:
+        out = np.zeros(self._size, dtype=self._dtype)
+        sub_row = self._get_row(index)
+        if sub_row is not None:
+            indices, data = sub_row
+            out[indices] = data
+        return out
+
+    def sum_rows(self, rows: typing.Union[np.ndarray, typing.Sequence[int]],
+                 columns: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.zeros(self._size, dtype=np.float64)
+        for index in rows:
+            sub_row = self._get_row(index)
+            if sub_row is not None:
+                indices, data = sub_row
+                out[indices] += data
+        return out if columns is None else out[columns]
+
+    def take_rows(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        return np.array([self.row(index)[columns] for index in rows], dtype=self._dtype).reshape(len(rows), -1)
+
+    def to_dense(self) -> np.ndarray:
+        out = np.zeros([self._size, self._size], dtype=self._dtype)
+        for index, (indices, data) in self._items():
+            out[index, indices] = data
+        return out
+
+    def scaled(self, scale: np.ndarray, dtype: typing.Any) -> 'SparseStorage':
+        arrays = self.arrays()
+        arrays['data'] = (arrays['data'] / scale[arrays['indices']]).astype(dtype)
+        return self.from_arrays(self._size, arrays)
+
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        indptr = np.zeros(self._size + 1, dtype=np.int64)
+        all_indices = [np.zeros(0, dtype=np.int32)]
+        all_data = [np.zeros(0, dtype=self._dtype)]
+        for slot, (indices, data) in self._items():
+            indptr[slot + 1] = len(indices)
+            all_indices.append(indices)
+            all_data.append(data)
+
+        return {
+            'indptr': np.cumsum(indptr),
+            'indices': np.concatenate(all_indices),
+            'data': np.concatenate(all_data),
+        }
+
+    @classmethod
+    def from_arrays(cls, size: int, arrays: typing.Dict[str, np.ndarray]) -> 'SparseStorage':
+        storage = cls(size, arrays['data'].dtype)
+        storage._csr = (arrays['indptr'], arrays['indices'], arrays['data'])
+        return storage
+
+
+# Training only ever adds symmetric blocks, so only the upper triangle
+# (diagonal included) is kept, row after row in one flat array
+class PackedStorage(Storage):
+
+    kind = 'packed'
+    in_place = True
+
+    def __init__(self, size: int, dtype: typing.Any = np.float64) -> None:
+        self.packed = np.zeros(size * (size + 1) // 2, dtype=dtype)
+        self._set_size(size)
+
+    def _set_size(self, size: int) -> None:
+        self._size = size
+        # (i, j) with i <= j is at _starts[i] + j
+        rows = np.arange(size, dtype=np.intp)
+        self._starts = rows * size - rows * (rows + 1) // 2
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self.packed.nbytes
+
+    def _positions(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        # Broadcasts rows against columns, the lower triangle is read through its mirror
+        return self._starts[np.minimum(rows, columns)] + np.maximum(rows, columns)
+
+    def add(self, slots: np.ndarray, block: typing.Any) -> None:
+        slots = np.asarray(slots)
+        order = np.argsort(slots)
+        slots = slots[order]
+        block = np.broadcast_to(_cast(block, self.packed.dtype), (len(slots), len(slots)))
+        upper, lower = np.triu_indices(len(slots))
+        self.packed[self._starts[slots[upper]] + slots[lower]] += block[order[upper], order[lower]]
+
+    def add_pairs(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        # The mirrored pairs below the diagonal are left out
+        upper = rows <= columns
+        np.add.at(self.packed, self._starts[rows[upper]] + columns[upper], _cast(values[upper], self.packed.dtype))
+
+    def add_storage(self, other: Storage) -> None:
+        if isinstance(other, PackedStorage):
+            self.packed += other.packed
+        else:
+            self.packed += _cast(other.to_dense()[np.triu_indices(self._size)], self.packed.dtype)
+
+    def row(self, index: int) -> np.ndarray:
+        return self.packed[self._positions(np.intp(index), np.arange(self._size))]
+
+    def sum_rows(self, rows: typing.Union[np.ndarray, typing.Sequence[int]],
+                 columns: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        if columns is None:
+            columns = np.arange(self._size)
+        return np.sum(self.take_rows(np.asarray(rows, dtype=np.intp), columns), axis=0, dtype=np.float64)
+
+    def take_rows(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        return self.packed[self._positions(np.asarray(rows, dtype=np.intp)[:, None], np.asarray(columns))]
+
+    def to_dense(self) -> np.ndarray:
+        out = np.zeros([self._size, self._size], dtype=self.packed.dtype)
+        upper = np.triu_indices(self._size)
+        out[upper] = self.packed
+        out.T[upper] = self.packed
+        return out
+
+    def scaled(self, scale: np.ndarray, dtype: typing.Any) -> DenseStorage:
+        # Dividing columns by different scales breaks the symmetry, so the result is square
+        return DenseStorage.from_arrays(self._size, {'matrix': (self.to_dense() / scale).astype(dtype)})
+
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        return {'packed': self.packed}
+
+    @classmethod
+    def from_arrays(cls, size: int, arrays: typing.Dict[str, np.ndarray]) -> 'PackedStorage':
+        storage = cls.__new__(cls)
+        storage.packed = arrays['packed']
+        storage._set_size(size)
+        return storage
+
+
+STORAGES: typing.Dict[str, typing.Type[Storage]] = {
+    DenseStorage.kind: DenseStorage,
+    SparseStorage.kind: SparseStorage,
+    PackedStorage.kind: PackedStorage,
+}
@@ -0,0 +1,210 @@
+import itertools
+import json
+import os
+import time
+import typing
+import numpy as np
+
+from hearthstone import fetch
+from hearthstone import files
+from hearthstone import pagecache
+
+from hs_deckgen import model as hs_model
+from hs_deckgen import pipeline as hs_pipeline
+
+
+class Delta(typing.NamedTuple):
+    added: int
+    removed: int
+    skipped: int
+
+
+# Append-only JSON-lines record of the decks applied to a model, one
+# {"op": "add" | "remove", "key": url or deck code, "cards": [...]} per line.
+# Added decks keep their card ids so that removing them needs no refetch.
+# An update's entries sit between a {"op": "begin"} and a {"op": "commit"}
+# line and only count once committed, older logs have neither.
+class DeckLog:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # The decks included up to a committed offset, so that the whole log needn't be replayed
+        self.snapshot_path = f'{path}.snapshot'
+
+    def _snapshot(self) -> typing.Tuple[typing.Dict[str, typing.List[int]], int]:
+        if not os.path.exists(self.snapshot_path):
+            return {}, 0
+        with open(self.snapshot_path) as stream:
+            snapshot = json.load(stream)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < snapshot['offset']:
+            # The log was replaced since, replay it whole
+            return {}, 0
+        return snapshot['included'], snapshot['offset']
+
+    def replay(self) -> typing.Tuple[typing.Dict[str, typing.List[int]], typing.Optional[int], int]:
+        # The committed decks, where an update that was begun but never committed starts,
+        # and where the last complete line ends
+        included, offset = self._snapshot()
+        pending: typing.Optional[int] = None
+        entries: typing.List[typing.Dict[str, typing.Any]] = []
+        if not os.path.exists(self.path):
+            return included, pending, offset
+
+        with open(self.path, 'rb') as stream:
+            stream.seek(offset)
+            for line in stream:
+                if not line.endswith(b'\n'):
+                    # Cut off by a crash, only an uncommitted update can end this way
+                    break
+                position, offset = offset, offset + len(line)
+                if not line.strip():
+                    continue
+                entry = json.loads(line.decode('utf-8'))
+                if entry['op'] == 'begin':
+                    pending, entries = position, []
+                elif entry['op'] == 'commit':
+                    _apply_entries(included, entries)
+                    pending, entries = None, []
+                elif pending is not None:
+                    entries.append(entry)
+                else:
+                    _apply_entries(included, [entry])
+        return included, pending, offset
+
+    def included(self) -> typing.Dict[str, typing.List[int]]:
+        return self.replay()[0]
+
+    def _append(self, entries: typing.Iterable[typing.Dict[str, typing.Any]]) -> int:
+        with open(self.path, 'a') as stream:
+            offset = stream.tell()
+            for entry in entries:
+                stream.write(json.dumps(entry) + '\n')
+            stream.flush()
+            os.fsync(stream.fileno())
+        return offset
+
+    def begin(self, entries: typing.Iterable[typing.Dict[str, typing.Any]]) -> int:
+        # Logged before the model is changed, returns the offset that identifies the update
+        return self._append(itertools.chain([{'op': 'begin', 'time': time.time()}], entries))
+
+    def commit(self) -> None:
+        self._append([{'op': 'commit'}])
+        included, _, offset = self.replay()
+        # Snapshots are rewritten once the log has grown by as much as they hold
+        _, snapshot_offset = self._snapshot()
+        snapshot_size = os.path.getsize(self.snapshot_path) if snapshot_offset else 0
+        if offset - snapshot_offset > snapshot_size:
+            with files.atomic_write(self.snapshot_path) as stream:
+                stream.write(json.dumps({'offset': offset, 'included': included}).encode('utf-8'))
+
+    def rollback(self, offset: int) -> None:
+        # Drops the update begun at offset, and whatever a crash left after it
+        with open(self.path, 'r+b') as stream:
+            stream.truncate(offset)
+            stream.flush()
+            os.fsync(stream.fileno())
+
+
+def _apply_entries(included: typing.Dict[str, typing.List[int]],
+                   entries: typing.Iterable[typing.Dict[str, typing.Any]]) -> None:
+    for entry in entries:
+        if entry['op'] == 'add':
+            included[entry['key']] = entry['cards']
+        else:
+            included.pop(entry['key'], None)
+
+
+def plan_delta(model: hs_model.HSModel, included: typing.Dict[str, typing.List[int]],
+               records: typing.Iterable[hs_pipeline.Record], fetcher: typing.Optional[fetch.Fetcher] = None,
+               page_cache: typing.Optional[pagecache.PageCache] = None
+               ) -> typing.Tuple[Delta, typing.List[typing.Dict[str, typing.Any]]]:
+    # The log entries records make, without changing the model yet.
+    # Decks already in the model aren't added again, and only those are removed.
+    removals: typing.Dict[str, typing.List[int]] = {}
+    additions: typing.Dict[str, hs_pipeline.Record] = {}
+    for record in records:
+        if record.remove:
+            additions.pop(record.key, None)
+            if record.key in included:
+                removals[record.key] = included[record.key]
+        elif record.key in removals:
+            del removals[record.key]
+        elif record.key not in included:
+            additions[record.key] = record
+
+    now = time.time()
+    entries = [{'op': 'remove', 'key': key, 'cards': cards, 'time': now} for key, cards in removals.items()]
+
+    # Only the added decks are fetched, the rest of the corpus is never looked at
+    skipped = 0
+    for record, card_ids in hs_pipeline.decks(additions.values(), fetcher, page_cache):
+        if card_ids is not None and model.playable(card_ids):
+            entries.append({'op': 'add', 'key': record.key, 'cards': card_ids.tolist(), 'time': now})
+        else:
+            skipped += 1
+    return Delta(len(entries) - len(removals), len(removals), skipped), entries
+
+
+def apply_delta(model: hs_model.HSModel, entries: typing.List[typing.Dict[str, typing.Any]],
+                batch_size: int = 256) -> None:
+    model.untrain_ids((entry['cards'] for entry in entries if entry['op'] == 'remove'), batch_size)
+    model.train_ids((entry['cards'] for entry in entries if entry['op'] == 'add'), batch_size)
+
+
+def _journal_path(path: str) -> str:
+    return f'{path}.journal'
+
+
+def recover(path: str, log: DeckLog) -> None:
+    # Finishes an update_file that crashed: the model and the log go back to agreeing on its decks
+    _, pending, end = log.replay()
+    journal = _journal_path(path)
+    if pending is not None and os.path.exists(journal):
+        # Changed in place, some of the update may have reached the file: undo all of it
+        with open(path, 'r+b') as stream:
+            model = hs_model.HSModel.load(stream, mmap_mode='r+')
+        with np.load(journal) as backup:
+            model.restore_rows(dict(backup))
+        model.flush()
+        log.rollback(pending)
+    elif pending is not None:
+        with open(path, 'rb') as stream:
+            model = hs_model.HSModel.load(stream, mmap_mode='c')
+        if model.meta.get('log_offset') == pending:
+            # The rewritten model was saved, only its commit is missing
+            log.rollback(end)
+            log.commit()
+        else:
+            log.rollback(pending)
+    if os.path.exists(journal):
+        os.unlink(journal)
+
+
+def update_file(path: str, log: DeckLog, records: typing.Iterable[hs_pipeline.Record],
+                fetcher: typing.Optional[fetch.Fetcher] = None,
+                page_cache: typing.Optional[pagecache.PageCache] = None, batch_size: int = 256) -> Delta:
+    recover(path, log)
+    # Copy-on-write first, only a model that maps fully into fixed-size arrays is reopened for writing
+    with open(path, 'rb') as stream:
+        model = hs_model.HSModel.load(stream, mmap_mode='c')
+    delta, entries = plan_delta(model, log.included(), records, fetcher, page_cache)
+
+    # Logged as begun before the model changes and committed once it is written, a crash in
+    # between is undone by recover(), so the log never disagrees with the model file
+    offset = log.begin(entries)
+    if model.mapped_in_place():
+        with open(path, 'r+b') as stream:
+            model = hs_model.HSModel.load(stream, mmap_mode='r+')
+        backup = model.backup_rows(entry['cards'] for entry in entries)
+        with files.atomic_write(_journal_path(path)) as stream:
+            np.savez(stream, slots=backup['slots'], block=backup['block'], norm=backup['norm'])
+        apply_delta(model, entries, batch_size)
+        model.flush()
+    else:
+        apply_delta(model, entries, batch_size)
+        model.meta['log_offset'] = offset
+        model.save_file(path)
+    log.commit()
+    if os.path.exists(_journal_path(path)):
+        os.unlink(_journal_path(path))
+    return delta
@@ -0,0 +1,51 @@
+import contextlib
+import queue
+import threading
+import typing
+
+from selenium import webdriver
+from selenium.webdriver import FirefoxOptions
+
+
+class BrowserPool:
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._idle: queue.Queue = queue.Queue()
+        self._browsers: typing.List[typing.Any] = []
+        self._started = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_browser() -> typing.Any:
+        opts = FirefoxOptions()
+        opts.add_argument("--headless")
+        browser = webdriver.Firefox(firefox_options=opts)
+        browser.implicitly_wait(10) # seconds
+        return browser
+
+    @contextlib.contextmanager
+    def browser(self) -> typing.Iterator[typing.Any]:
+        # Browsers are started lazily, up to size of them, then shared
+        with self._lock:
+            start_new = self._idle.empty() and self._started < self.size
+            if start_new:
+                self._started += 1
+
+        if start_new:
+            browser = self._new_browser()
+            with self._lock:
+                self._browsers.append(browser)
+        else:
+            browser = self._idle.get()
+
+        try:
+            yield browser
+        finally:
+            self._idle.put(browser)
+
+    def close(self) -> None:
+        for browser in self._browsers:
+            browser.quit()
+        self._browsers = []
+        self._started = 0
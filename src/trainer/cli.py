@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+import os
 import typing
 import sys
 import click
@@ -6,6 +7,9 @@ import json
 
 from trainer import replay_trainer
 from hearthstone import api
+from hearthstone import fetch
+from hearthstone import metrics
+from hs_deckgen import checkpoint as hs_checkpoint
 
 
 @contextmanager
@@ -24,22 +28,59 @@ def io_or_std(path: typing.Optional[str], mode: str = 'r') -> typing.IO:
             yield sys.stdin.buffer
 
 @click.group()
-def main() -> None:
-    pass
+@click.option('--offline', is_flag=True, default=False, help='Only use the cached card catalogue')
+@click.option('--profile', is_flag=True, default=False, help='Report per-stage timings, counters and peak memory')
+@click.option('--profile-out', type=click.Path(dir_okay=False), required=False,
+              help='Write the report here, not stderr')
+@click.pass_context
+def main(ctx: click.Context, offline: bool, profile: bool, profile_out: typing.Optional[str]) -> None:
+    if offline:
+        api.HearthstoneAPI.OFFLINE = True
+    if profile:
+        metrics.reset()
+        metrics.start_tracing()
+        ctx.call_on_close(lambda: metrics.write_report(profile_out))
 
 @main.command()
 @click.option('--outfile', type=click.Path(exists=False), required=False)
 @click.option('--input_cards', type=click.Path(exists=True), required=False)
 @click.option('--pages', type=int, required=False)
-def replay(outfile: typing.Optional[str], input_cards: typing.Optional[str], pages: typing.Optional[int]) -> None:
-    if input_cards:
-        with open(input_cards) as file:
-            cards = map(api.HearthstoneAPI.card_from_id, json.load(file))
-
-        with io_or_std(outfile, 'wb') as fout:
-            mod = replay_trainer.ReplayTrainer.model_from_cards(cards)
-            mod.save(fout)
-    else:
-        with io_or_std(outfile, 'wb') as fout:
-            mod = replay_trainer.ReplayTrainer.new_model(pages)
-            mod.save(fout)
+@click.option('--workers', type=int, default=4, help='Headless browsers crawling deck listings at once')
+@click.option('--concurrency', type=int, default=8, help='Deck pages fetched at once')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), required=False,
+              help='Periodically save progress here, defaults to OUTFILE.checkpoint')
+@click.option('--checkpoint-interval', type=float, default=300.0, help='Seconds between checkpoints')
+@click.option('--resume', is_flag=True, default=False, help='Continue from the last checkpoint')
+def replay(outfile: typing.Optional[str], input_cards: typing.Optional[str], pages: typing.Optional[int],
+           workers: int, concurrency: int, checkpoint_path: typing.Optional[str], checkpoint_interval: float,
+           resume: bool) -> None:
+    replay_trainer.ReplayTrainer.WORKERS = workers
+    fetcher = fetch.Fetcher(concurrency)
+
+    if checkpoint_path is None and outfile:
+        checkpoint_path = f'{outfile}.checkpoint'
+
+    # Listings are crawled again on resume, the decks already trained are recognised by URL
+    mod = None
+    checkpoint = None
+    if resume:
+        if not (checkpoint_path and os.path.exists(checkpoint_path)):
+            raise click.UsageError('--resume needs an existing checkpoint')
+        mod, checkpoint = hs_checkpoint.Checkpoint.resume(checkpoint_path, checkpoint_interval, keep_urls=True)
+    elif checkpoint_path:
+        checkpoint = hs_checkpoint.Checkpoint(checkpoint_path, checkpoint_interval, keep_urls=True)
+
+    try:
+        if input_cards:
+            with open(input_cards) as file:
+                cards = map(api.HearthstoneAPI.card_from_id, json.load(file))
+            mod = replay_trainer.ReplayTrainer.model_from_cards(cards, fetcher, checkpoint, mod)
+        else:
+            mod = replay_trainer.ReplayTrainer.new_model(pages, fetcher, checkpoint, mod)
+    finally:
+        replay_trainer.ReplayTrainer.close()
+
+    with io_or_std(outfile, 'wb') as fout:
+        mod.save(fout)
+    if checkpoint is not None:
+        checkpoint.remove()
@@ -1,68 +1,116 @@
+import concurrent.futures
 import typing
 
-from selenium import webdriver
-from selenium.webdriver import FirefoxOptions
-from selenium.common.exceptions import StaleElementReferenceException
-
-from hearthstone import api
 from hearthstone import deck
 from hearthstone import card
+from hearthstone import fetch
+from hearthstone import scrapers
+from hs_deckgen import checkpoint as hs_checkpoint
 from hs_deckgen import model
+from hs_deckgen import pipeline
+
+if typing.TYPE_CHECKING:
+    from trainer import browser
+
+_DECK_LIST_WRAPPER = "html/body/div[@id = 'decks-container']/div[@class = 'decks']/div[@class = 'deck-list-wrapper']"
+
 
 class ReplayTrainer:
 
-    _BROWSER = None
+    _POOL: typing.Optional['browser.BrowserPool'] = None
+    WORKERS = 4
 
     @classmethod
-    def _setup_browser(cls) -> None:
-        opts = FirefoxOptions()
-        opts.add_argument("--headless")
-        cls._BROWSER = webdriver.Firefox(firefox_options=opts)
-        cls._BROWSER.implicitly_wait(10) # seconds
-
-    def lazy_browser(func):
-        def decorated(*args, **kwargs):
-            if ReplayTrainer._BROWSER is None:
-                ReplayTrainer._setup_browser()
-            return func(*args, **kwargs)
-        return decorated
+    def _pool(cls) -> 'browser.BrowserPool':
+        if cls._POOL is None:
+            # Selenium is only loaded once a listing is actually crawled
+            from trainer import browser
+            cls._POOL = browser.BrowserPool(cls.WORKERS)
+        return cls._POOL
 
     @classmethod
-    @lazy_browser
-    def pull_decks(cls, start: str, max_page: typing.Optional[int] = None) -> typing.Iterator[deck.Deck]:
-        browser = cls._BROWSER
-
-        browser.get(start)
-
-        deck_list_wrapper = browser.find_element_by_xpath("html/body/div[@id = 'decks-container']/div[@class = 'decks']/div[@class = 'deck-list-wrapper']")
-        pages = int(deck_list_wrapper.find_elements_by_xpath("div/div/nav/ul/li[@class = 'visible-lg-inline']/a")[-1].text)
-        forward_button = deck_list_wrapper.find_element_by_xpath('div/div/nav/ul/li[not(@*)]/a')
+    def close(cls) -> None:
+        # Quits the crawling browsers, they are left running otherwise
+        if cls._POOL is not None:
+            cls._POOL.close()
+            cls._POOL = None
+
+    @staticmethod
+    def _page_url(start: str, page: int) -> str:
+        # Listings keep their filters in the fragment, so the page number goes there too
+        if page == 1:
+            return start
+        if '#' not in start:
+            return f'{start}#page={page}'
+        return f'{start}{"" if start.endswith("#") else "&"}page={page}'
 
-        if max_page:
-            pages = min(max_page, pages)
+    @classmethod
+    def _page_count(cls, start: str) -> int:
+        with cls._pool().browser() as browser:
+            browser.get(start)
+            deck_list_wrapper = browser.find_element_by_xpath(_DECK_LIST_WRAPPER)
+            page_links = deck_list_wrapper.find_elements_by_xpath("div/div/nav/ul/li[@class = 'visible-lg-inline']/a")
+            return int(page_links[-1].text)
 
-        for _ in range(pages):
+    @classmethod
+    def _deck_links(cls, start: str, page: int) -> typing.List[str]:
+        with cls._pool().browser() as browser:
+            browser.get(cls._page_url(start, page))
+            deck_list_wrapper = browser.find_element_by_xpath(_DECK_LIST_WRAPPER)
             deck_links = deck_list_wrapper.find_elements_by_xpath("div[@class = 'deck-list']/ul/li/a")
-            yield from (api.ReplayAPI.deck_from_url(node.get_attribute('href')) for node in deck_links)
-            try:
-                forward_button.click()
-            except StaleElementReferenceException:
-                forward_button = deck_list_wrapper.find_element_by_xpath('div/div/nav/ul/li[not(@*)]/a')
-                forward_button.click()
+            return [node.get_attribute('href') for node in deck_links]
 
     @classmethod
-    def model_from_cards(cls, required: typing.Iterable[card.Card]) -> model.HSModel:
-        my_model = model.HSModel()
+    def pull_deck_urls(cls, starts: typing.Iterable[str],
+                       max_page: typing.Optional[int] = None) -> typing.Iterator[str]:
+        starts = list(starts)
+
+        with concurrent.futures.ThreadPoolExecutor(cls._pool().size) as executor:
+            if max_page == 1:
+                pages = [1] * len(starts)
+            else:
+                pages = list(executor.map(cls._page_count, starts))
+                if max_page:
+                    pages = [min(max_page, count) for count in pages]
+
+            listings = executor.map(lambda job: cls._deck_links(*job),
+                                    [(start, page) for start, count in zip(starts, pages)
+                                     for page in range(1, count + 1)])
+
+            # Overlapping queries list the same decks, each is only yielded once
+            seen: typing.Set[str] = set()
+            for links in listings:
+                for link in links:
+                    if link not in seen:
+                        seen.add(link)
+                        yield link
 
-        for card in required:
-            url = f'https://hsreplay.net/decks/#includedCards={card.db_id}'
-            decks = cls.pull_decks(url, 1)
-            for deck in decks:
-                my_model.train(deck.cards)
+    @classmethod
+    def pull_decks(cls, start: str, max_page: typing.Optional[int] = None,
+                   fetcher: typing.Optional[fetch.Fetcher] = None) -> typing.Iterator[deck.Deck]:
+        return scrapers.ReplayAPI.decks_from_urls(cls.pull_deck_urls([start], max_page), fetcher)
 
+    @classmethod
+    def _train_urls(cls, urls: typing.Iterable[str], fetcher: typing.Optional[fetch.Fetcher],
+                    checkpoint: typing.Optional[hs_checkpoint.Checkpoint],
+                    my_model: typing.Optional[model.HSModel]) -> model.HSModel:
+        my_model = my_model or model.HSModel()
+        records = (pipeline.Record(index, url, None) for index, url in enumerate(urls))
+        pipeline.TrainingPipeline(my_model, fetcher).run(records, checkpoint)
         return my_model
 
     @classmethod
-    def new_model(cls, max_page: typing.Optional[int] = None) -> model.HSModel:
-        return model.HSModel.from_decks(cls.top_30_days('https://hsreplay.net/decks/#timeRange=LAST_30_DAYS', max_page))
+    def model_from_cards(cls, required: typing.Iterable[card.Card],
+                         fetcher: typing.Optional[fetch.Fetcher] = None,
+                         checkpoint: typing.Optional[hs_checkpoint.Checkpoint] = None,
+                         my_model: typing.Optional[model.HSModel] = None) -> model.HSModel:
+        urls = cls.pull_deck_urls((f'https://hsreplay.net/decks/#includedCards={card.db_id}' for card in required), 1)
+        return cls._train_urls(urls, fetcher, checkpoint, my_model)
 
+    @classmethod
+    def new_model(cls, max_page: typing.Optional[int] = None,
+                  fetcher: typing.Optional[fetch.Fetcher] = None,
+                  checkpoint: typing.Optional[hs_checkpoint.Checkpoint] = None,
+                  my_model: typing.Optional[model.HSModel] = None) -> model.HSModel:
+        urls = cls.pull_deck_urls(['https://hsreplay.net/decks/#timeRange=LAST_30_DAYS'], max_page)
+        return cls._train_urls(urls, fetcher, checkpoint, my_model)
@@ -0,0 +1,75 @@
+import http.server
+import socketserver
+import threading
+import pytest
+from hearthstone import api
+from hearthstone import card
+from hearthstone import catalogue
+from hearthstone import hsdata
+
+
+def make_card(db_id: int, hs_class: hsdata.HSClass = hsdata.HSClass.MAGE,
+              rarity: hsdata.Rarity = hsdata.Rarity.COMMON) -> card.Card:
+    return card.Card(db_id=db_id, hs_class=hs_class, rarity=rarity, name=f'Card {db_id}')
+
+
+CARDS = [make_card(i) for i in range(8)] + \
+        [make_card(8, rarity=hsdata.Rarity.LEGENDARY)] + \
+        [make_card(9, hs_class=hsdata.HSClass.NEUTRAL)] + \
+        [make_card(10, hs_class=hsdata.HSClass.WARRIOR)]
+
+DECKS = [
+    [CARDS[0], CARDS[0], CARDS[1], CARDS[2], CARDS[8]],
+    [CARDS[1], CARDS[2], CARDS[3], CARDS[9], CARDS[9]],
+    [CARDS[4], CARDS[5], CARDS[5], CARDS[6]],
+]
+
+REPLAY_PAGE = '<html><body><div id="deck-info" data-deck-cards="{}" data-deck-class="MAGE"></div></body></html>'
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+
+    def do_GET(self):
+        StandIn.hits[self.path] = StandIn.hits.get(self.path, 0) + 1
+        if self.path.startswith('/flaky') and StandIn.hits[self.path] == 1:
+            self._reply(503, b'')
+        elif self.path.startswith('/missing'):
+            self._reply(404, b'')
+        else:
+            cards = self.path.rsplit('/', 1)[-1]
+            self._reply(200, REPLAY_PAGE.format(cards).encode('utf-8'))
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def card_catalogue(monkeypatch):
+    cards = catalogue.CardCatalogue.from_cards(CARDS)
+    monkeypatch.setattr(api.HearthstoneAPI, '_CATALOGUE', cards)
+    return cards
+
+
+@pytest.fixture
+def stand_in(card_catalogue):  # pylint: disable=redefined-outer-name,unused-argument
+    StandIn.hits = {}
+    server = ThreadingServer(('127.0.0.1', 0), StandIn)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    thread.join()
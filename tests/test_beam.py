@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from hearthstone import card
+from hearthstone import catalogue
+from hearthstone import hsdata
+from hs_deckgen import constraints
+from hs_deckgen import model
+from tests.conftest import CARDS, DECKS
+
+# The same pool, with a spread of mana costs
+COSTED = [sub_card._replace(cost=sub_card.db_id % 4) for sub_card in CARDS]
+COSTED_DECKS = [[COSTED[sub_card.db_id] for sub_card in sub_deck] for sub_deck in DECKS]
+
+
+@pytest.fixture
+def trained(monkeypatch):
+    cards = catalogue.CardCatalogue.from_cards(COSTED)
+    monkeypatch.setattr(model.api.HearthstoneAPI, '_CATALOGUE', cards)
+    return model.HSModel.from_decks(COSTED_DECKS, cards=cards)
+
+
+def test_catalogue_keeps_cost():
+    cards = catalogue.CardCatalogue.from_cards(COSTED)
+    assert cards.card_from_id(7) == COSTED[7]
+    assert card.Card.from_json(COSTED[7].to_json()) == COSTED[7]
+
+
+def test_beam_respects_constraints(trained):
+    rules = constraints.Constraints(curve=[2, 4, 3, 3], rarity_caps={hsdata.Rarity.LEGENDARY: 0})
+    decks = trained.generate_beam([COSTED[4]], hsdata.HSClass.MAGE, rules, width=4, n=3, deck_size=12)
+
+    assert len(decks) == 3
+    assert len({tuple(sorted(sub_card.db_id for sub_card in sub_deck.cards)) for sub_deck in decks}) == 3
+    for sub_deck in decks:
+        ids = [sub_card.db_id for sub_card in sub_deck.cards]
+        assert len(ids) == 12 and ids[0] == 4
+        assert np.all(np.bincount([sub_card.cost for sub_card in sub_deck.cards], minlength=4) <= [2, 4, 3, 3])
+        assert 8 not in ids
+        assert max(ids.count(db_id) for db_id in ids) <= 2
+
+
+def test_beam_follows_co_occurrence(trained):
+    best, = trained.generate_beam([COSTED[4]], hsdata.HSClass.MAGE, width=4, deck_size=4)
+    assert sorted(sub_card.db_id for sub_card in best.cards) == [4, 5, 5, 6]
+
+    single, = trained.generate_beam([COSTED[4]], hsdata.HSClass.MAGE, constraints.Constraints(singleton=True),
+                                    width=4, deck_size=3)
+    assert sorted(sub_card.db_id for sub_card in single.cards) == [4, 5, 6]
+
+
+def test_infeasible_constraints(trained):
+    with pytest.raises(ValueError):
+        trained.generate_beam([], hsdata.HSClass.MAGE, constraints.Constraints(curve=[1, 1, 1, 1, 0, 0, 0, 0]),
+                              deck_size=5)
+
+
+def test_beam_needs_every_card_in_the_catalogue(trained, monkeypatch):
+    monkeypatch.setattr(model.api.HearthstoneAPI, '_CATALOGUE', catalogue.CardCatalogue.from_cards(COSTED[:7]))
+    with pytest.raises(ValueError, match='missing from the catalogue'):
+        trained.generate_beam([], hsdata.HSClass.MAGE, deck_size=4)
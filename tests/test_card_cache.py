@@ -0,0 +1,76 @@
+import json
+import pytest
+import requests
+from hearthstone import api
+from hearthstone import cache
+from hearthstone import catalogue
+from tests.conftest import CARDS
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    @property
+    def content(self):
+        return json.dumps(self._payload).encode('utf-8')
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def card_cache(monkeypatch, tmp_path):
+    path = str(tmp_path / 'cards.npz')
+    monkeypatch.setenv('HS_DECKGEN_CARD_CACHE', path)
+    monkeypatch.setattr(api.HearthstoneAPI, '_CATALOGUE', None)
+    monkeypatch.setattr(api.HearthstoneAPI, 'OFFLINE', False)
+    return path
+
+
+def test_round_trip(card_cache):
+    cache.write(card_cache, catalogue.CardCatalogue.from_cards(CARDS), {'etag': 'abc'})
+    meta, cards = cache.read(card_cache)
+
+    assert meta['etag'] == 'abc'
+    assert cards.all_cards() == CARDS
+
+
+def test_offline_uses_cache(monkeypatch, card_cache):
+    monkeypatch.setattr(api.HearthstoneAPI, 'OFFLINE', True)
+    with pytest.raises(RuntimeError):
+        api.HearthstoneAPI.card_from_id(0)
+
+    cache.write(card_cache, catalogue.CardCatalogue.from_cards(CARDS), {})
+    assert api.HearthstoneAPI.card_from_id(3) == CARDS[3]
+
+
+def test_refresh_revalidates(monkeypatch, card_cache):
+    requests_seen = []
+
+    def fake_get(url, headers, timeout):
+        assert timeout
+        requests_seen.append(headers)
+        if headers.get('If-None-Match') == 'v1':
+            return FakeResponse(304)
+        payload = [{'dbfId': 1, 'playerClass': 'MAGE', 'rarity': 'COMMON', 'name': 'Card 1'}]
+        return FakeResponse(200, payload, {'ETag': 'v1'})
+
+    monkeypatch.setattr(requests, 'get', fake_get)
+
+    assert api.HearthstoneAPI.refresh()
+    assert not api.HearthstoneAPI.refresh()
+    assert requests_seen == [{}, {'If-None-Match': 'v1'}]
+    assert api.HearthstoneAPI.card_from_id(1).name == 'Card 1'
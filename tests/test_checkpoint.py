@@ -0,0 +1,55 @@
+import io
+import numpy as np
+import pytest
+from hearthstone import deck
+from hearthstone import fetch
+from hs_deckgen import checkpoint
+from hs_deckgen import model
+from hs_deckgen import pipeline
+from tests.conftest import CARDS, StandIn
+
+
+DECK_IDS = [[0, 0, 1, 2, 8], [1, 2, 3, 9, 9], [4, 5, 5, 6], [0, 3, 10]]
+
+
+def _run(records, mod, saved):
+    return pipeline.TrainingPipeline(mod, fetch.Fetcher(backoff=0.01), batch_size=2,
+                                     progress=pipeline.Progress(None)).run(records, saved)
+
+
+@pytest.mark.usefixtures('card_catalogue')
+def test_resume_skips_trained_records(tmp_path):
+    codes = deck.encode_deck_codes([0] * len(DECK_IDS), [np.array(ids) for ids in DECK_IDS])
+    path = str(tmp_path / 'model.checkpoint')
+
+    # The first run dies after two records, its checkpoint saved after each of them
+    first = checkpoint.Checkpoint(path, interval=0.0)
+    records = list(pipeline.read_records(io.StringIO('\n'.join(codes))))
+    _run(records[:2], model.HSModel('dense', CARDS), first)
+
+    resumed, second = checkpoint.Checkpoint.resume(path)
+    assert second.cursor == 2 and 'checkpoint' not in resumed.meta
+    stats = _run(records, resumed, second)
+
+    expected = model.HSModel('dense', CARDS)
+    expected.train_ids(DECK_IDS)
+    assert stats.read == 2
+    assert np.array_equal(resumed._model.to_dense(), expected._model.to_dense())
+    assert np.array_equal(resumed._norm, expected._norm)
+
+
+def test_resume_by_url(stand_in, tmp_path):
+    path = str(tmp_path / 'model.checkpoint')
+    urls = [f'{stand_in}/deck/{",".join(map(str, ids))}' for ids in DECK_IDS]
+
+    first = checkpoint.Checkpoint(path, interval=0.0, keep_urls=True)
+    _run([pipeline.Record(i, url, None) for i, url in enumerate(urls[2:])], model.HSModel('dense', CARDS), first)
+
+    # Crawls come back in another order, so the cursor is the set of URLs seen
+    resumed, second = checkpoint.Checkpoint.resume(path, keep_urls=True)
+    _run([pipeline.Record(i, url, None) for i, url in enumerate(urls)], resumed, second)
+
+    expected = model.HSModel('dense', CARDS)
+    expected.train_ids(DECK_IDS)
+    assert sum(StandIn.hits.values()) == len(urls)
+    assert np.array_equal(resumed._model.to_dense(), expected._model.to_dense())
@@ -1,8 +1,53 @@
+import subprocess
+import sys
+import pytest
 from click.testing import CliRunner
 from hs_deckgen import cli
+from trainer import cli as trainer_cli
+from trainer import replay_trainer
 
 def test_main() -> None:
     runner = CliRunner()
     result = runner.invoke(cli.main)
 
     assert result.exit_code == 0
+
+
+@pytest.mark.parametrize('curve', ['2,six,6', '1,1,1,1,1,1,1,1,1', '2,-1'])
+def test_deck_rejects_bad_curves(tmp_path, curve) -> None:
+    model = tmp_path / 'model'
+    model.write_bytes(b'')
+    result = CliRunner().invoke(cli.main, ['deck', '--model', str(model), '--curve', curve])
+
+    assert result.exit_code == 2
+    assert 'Invalid value for' in result.output and '--curve' in result.output
+
+
+@pytest.mark.parametrize('module', ['hs_deckgen.cli', 'trainer.cli'])
+def test_startup_skips_scraping_stacks(module) -> None:
+    # A fresh interpreter, this one has long imported everything
+    loaded = subprocess.run(
+        [sys.executable, '-c', f'import sys, {module}; print(" ".join(sorted(sys.modules)))'],
+        stdout=subprocess.PIPE, check=True,
+    ).stdout.decode('utf-8').split()
+    assert 'selenium' not in loaded
+    if module == 'hs_deckgen.cli':
+        assert not {'requests', 'lxml', 'asyncio'} & set(loaded)
+
+
+def test_replay_closes_browsers(monkeypatch) -> None:
+    class Pool:
+        closed = False
+
+        def close(self) -> None:
+            Pool.closed = True
+
+    def crawl(*_):
+        replay_trainer.ReplayTrainer._pool()
+        raise RuntimeError('crawl failed')
+
+    monkeypatch.setattr(replay_trainer.ReplayTrainer, '_POOL', Pool())
+    monkeypatch.setattr(replay_trainer.ReplayTrainer, 'new_model', crawl)
+    result = CliRunner().invoke(trainer_cli.main, ['replay'])
+    assert isinstance(result.exception, RuntimeError)
+    assert Pool.closed and replay_trainer.ReplayTrainer._POOL is None
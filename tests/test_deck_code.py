@@ -0,0 +1,56 @@
+import base64
+import numpy as np
+import pytest
+from hearthstone import deck
+from hearthstone import hsdata
+from hs_deckgen import model
+from tests.conftest import CARDS, DECKS
+
+
+HUNTER_CODE = 'AAECAR8GxwPJBLsFmQfZB/gIDI0B2AGoArUDhwSSBe0G6wfbCe0JgQ6HDgA='
+
+
+def test_decode():
+    (hero, card_ids), = deck.decode_deck_codes([HUNTER_CODE])
+    assert hero == 31
+    assert len(card_ids) == 30
+    assert np.count_nonzero(card_ids == 141) == 2
+
+
+def test_round_trip():
+    decks = [np.array([c.db_id for c in sub_deck]) for sub_deck in DECKS] + [np.array([1, 1, 1, 200, 70000])]
+    codes = deck.encode_deck_codes([637] * len(decks), decks)
+    assert codes[:1] == [deck.Deck(DECKS[0], hsdata.HSClass.MAGE).to_deck_code()]
+
+    for (hero, card_ids), expected in zip(deck.decode_deck_codes(codes), decks):
+        assert hero == 637
+        assert sorted(card_ids) == sorted(expected)
+
+
+def test_train_codes_matches_train():
+    codes = [deck.Deck(sub_deck, hsdata.HSClass.MAGE).to_deck_code() for sub_deck in DECKS]
+    from_codes = model.HSModel('dense', CARDS)
+    from_codes.train_codes(codes)
+
+    trained = model.HSModel.from_decks(DECKS, cards=CARDS)
+    assert np.array_equal(from_codes._model.to_dense(), trained._model.to_dense())
+    assert np.array_equal(from_codes._norm, trained._norm)
+
+
+def test_truncated_codes():
+    good = deck.Deck(DECKS[0], hsdata.HSClass.MAGE).to_deck_code()
+    # Ends inside a varint, its last byte has the continuation bit set
+    bad = base64.b64encode(base64.b64decode(HUNTER_CODE)[:-2] + b'\x8d').decode('utf-8')
+    short = base64.b64encode(base64.b64decode(HUNTER_CODE)[:-12]).decode('utf-8')
+
+    decoded = deck.try_decode_deck_codes([bad, good, short, 'not base64!', good])
+    assert [values is None for values in decoded] == [True, False, True, True, False]
+    with pytest.raises(ValueError):
+        deck.decode_deck_codes([bad])
+    (_, card_ids), = deck.decode_deck_codes([good])
+    assert sorted(card_ids) == sorted(c.db_id for c in DECKS[0])
+
+    from_codes = model.HSModel('dense', CARDS)
+    assert from_codes.train_codes([bad, good, HUNTER_CODE]) == [bad, HUNTER_CODE]
+    trained = model.HSModel.from_decks(DECKS[:1], cards=CARDS)
+    assert np.array_equal(from_codes._model.to_dense(), trained._model.to_dense())
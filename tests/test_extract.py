@@ -0,0 +1,33 @@
+import os
+import pytest
+from hearthstone import extract
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as stream:
+        return stream.read()
+
+
+def test_replay_deck_info():
+    hs_class, card_ids = extract.replay_deck_info(read_fixture('replay_deck.html'))
+    assert hs_class == 'MAGE'
+    assert len(card_ids) == 30
+    assert card_ids[:2] == [15569, 19976]
+
+
+def test_hearthpwn_deck_info():
+    hs_class, cards = extract.hearthpwn_deck_info(read_fixture('hearthpwn_deck.html'))
+    assert hs_class == 'WARRIOR'
+    assert len(cards) == 17
+    assert sum(count for _, count in cards) == 24
+    assert cards[0] == (34200, 1)
+
+
+def test_missing_nodes():
+    with pytest.raises(ValueError):
+        extract.replay_deck_info(b'<html><body><div id="other"></div></body></html>')
+    with pytest.raises(ValueError):
+        extract.hearthpwn_deck_info(b'<html><body></body></html>')
@@ -0,0 +1,29 @@
+import time
+from hearthstone import fetch
+from hearthstone import scrapers
+from tests.conftest import REPLAY_PAGE, StandIn
+
+
+def test_fetch_many_in_order(stand_in):
+    fetcher = fetch.Fetcher(concurrency=4, backoff=0.01)
+    urls = [f'{stand_in}/deck/{i}' for i in range(20)] + [f'{stand_in}/flaky/1', f'{stand_in}/missing/1']
+    results = list(fetcher.fetch_many(urls))
+
+    assert [result.url for result in results] == urls
+    assert all(result.content == REPLAY_PAGE.format(i).encode('utf-8') for i, result in enumerate(results[:20]))
+    assert results[20].error is None and StandIn.hits['/flaky/1'] == 2
+    assert results[21].error is not None
+
+
+def test_host_interval(stand_in):
+    fetcher = fetch.Fetcher(concurrency=4, host_interval=0.05)
+    start = time.monotonic()
+    list(fetcher.fetch_many([f'{stand_in}/deck/{i}' for i in range(5)]))
+    assert time.monotonic() - start >= 0.2
+
+
+def test_replay_decks_from_urls(stand_in):
+    urls = [f'{stand_in}/deck/0,1,1', f'{stand_in}/missing/1', f'{stand_in}/deck/4,5']
+    decks = list(scrapers.ReplayAPI.decks_from_urls(urls, fetch.Fetcher(backoff=0.01)))
+
+    assert [[c.db_id for c in sub_deck.cards] for sub_deck in decks] == [[0, 1, 1], [4, 5]]
@@ -0,0 +1,22 @@
+import json
+from hearthstone import metrics
+from hs_deckgen import model
+from tests.conftest import CARDS, DECKS
+
+
+def test_stage_timings_and_counters(tmp_path):
+    metrics.reset()
+    mod = model.HSModel('dense', CARDS)
+    mod.train_many(DECKS)
+    with metrics.timer('custom'):
+        metrics.count('custom.items', 3)
+
+    path = str(tmp_path / 'profile.json')
+    metrics.write_report(path)
+    with open(path) as stream:
+        report = json.load(stream)
+
+    assert report['stages']['model.train']['calls'] == 1
+    assert report['stages']['custom']['calls'] == 1
+    assert report['counters'] == {'model.decks_trained': len(DECKS), 'custom.items': 3}
+    assert report['wall_seconds'] > 0
@@ -0,0 +1,69 @@
+import os
+import time
+import pytest
+from hearthstone import fetch
+from hearthstone import pagecache
+from hearthstone import scrapers
+from tests.conftest import StandIn
+
+
+def test_decks_served_from_cache(stand_in, tmp_path):
+    urls = [f'{stand_in}/deck/0,1,1', f'{stand_in}/deck/4,5']
+    fetcher = fetch.Fetcher()
+
+    for decks_only in (False, True):
+        StandIn.hits = {}
+        page_cache = pagecache.PageCache(str(tmp_path / str(decks_only)), decks_only=decks_only)
+        first = list(scrapers.ReplayAPI.decks_from_urls(urls, fetcher, page_cache))
+        second = list(scrapers.ReplayAPI.decks_from_urls(urls, fetcher, page_cache))
+
+        assert first == second
+        assert sum(StandIn.hits.values()) == 2
+
+
+def test_ttl(tmp_path):
+    page_cache = pagecache.PageCache(str(tmp_path), ttl=60)
+    page_cache.put_page('http://a', b'page')
+    assert page_cache.get_page('http://a') == b'page'
+
+    path = page_cache._path('http://a', page_cache.PAGE)
+    os.utime(path, (time.time(), time.time() - 120))
+    assert page_cache.get_page('http://a') is None
+
+
+def test_size_bounded_eviction(tmp_path):
+    page_cache = pagecache.PageCache(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        page_cache.put_page(f'http://{i}', bytes(100))
+        path = page_cache._path(f'http://{i}', page_cache.PAGE)
+        os.utime(path, (time.time() - 100 + i, time.time()))
+
+    assert page_cache.get_page('http://0') is None
+    assert page_cache.get_page('http://2') is not None
+    assert pagecache.PageCache(str(tmp_path))._size <= 250
+
+
+def test_eviction_follows_use(monkeypatch, tmp_path):
+    page_cache = pagecache.PageCache(str(tmp_path), max_bytes=250)
+    # Evicting goes by the in-memory order, never back to the directory
+    monkeypatch.setattr(page_cache, '_entries', None)
+    page_cache.put_page('http://0', bytes(100))
+    page_cache.put_page('http://1', bytes(100))
+    assert page_cache.get_page('http://0') is not None
+    page_cache.put_page('http://2', bytes(100))
+
+    assert page_cache.get_page('http://1') is None
+    assert page_cache.get_page('http://0') is not None
+    assert page_cache._size == 200
+
+
+def test_failed_write_leaves_no_temp_file(monkeypatch, tmp_path):
+    page_cache = pagecache.PageCache(str(tmp_path))
+
+    def fail(*_):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(pagecache.os, 'replace', fail)
+    with pytest.raises(OSError):
+        page_cache.put_page('http://a', b'page')
+    assert not [name for _, _, names in os.walk(str(tmp_path)) for name in names]
@@ -0,0 +1,51 @@
+import io
+import json
+import numpy as np
+from hearthstone import deck
+from hearthstone import fetch
+from hs_deckgen import model
+from hs_deckgen import pipeline
+from tests.conftest import CARDS
+
+
+def test_read_records():
+    lines = '"https://hsreplay.net/decks/a/"\n\n{"code": "AAE"}\nhttps://hsreplay.net/decks/b/\n'
+    records = list(pipeline.read_records(io.StringIO(lines)))
+    assert records == [
+        pipeline.Record(0, 'https://hsreplay.net/decks/a/', None),
+        pipeline.Record(1, None, 'AAE'),
+        pipeline.Record(2, 'https://hsreplay.net/decks/b/', None),
+    ]
+
+    legacy = json.dumps(['https://hsreplay.net/decks/a/', 'AAE'])
+    assert list(pipeline.read_records(io.StringIO('\n ' + legacy))) == records[:2]
+
+
+def test_pipeline_matches_train_many(stand_in):
+    code, = deck.encode_deck_codes([0], [np.array([4, 5, 5, 6])])
+    lines = [f'{stand_in}/deck/0,0,1,2,8', f'{stand_in}/missing/1', code, f'{stand_in}/deck/1,2,3,9,9',
+             f'{stand_in}/deck/0,0,0']
+    trained = model.HSModel('dense', CARDS)
+    stats = pipeline.TrainingPipeline(trained, fetch.Fetcher(backoff=0.01), batch_size=2,
+                                      progress=pipeline.Progress(None)).run(
+                                          pipeline.read_records(io.StringIO('\n'.join(lines))))
+
+    expected = model.HSModel('dense', CARDS)
+    expected.train_ids([[0, 0, 1, 2, 8], [4, 5, 5, 6], [1, 2, 3, 9, 9]])
+    assert (stats.read, stats.trained, stats.skipped) == (5, 3, 2)
+    assert np.array_equal(trained._model.to_dense(), expected._model.to_dense())
+    assert np.array_equal(trained._norm, expected._norm)
+
+
+def test_decks_without_a_model(stand_in):
+    code, = deck.encode_deck_codes([0], [np.array([4, 5, 5, 6])])
+    lines = [f'{stand_in}/deck/0,0,1,2,8', f'{stand_in}/missing/1', code]
+    parsed = list(pipeline.decks(pipeline.read_records(io.StringIO('\n'.join(lines))), fetch.Fetcher(backoff=0.01)))
+    assert [record.position for record, _ in parsed] == [0, 1, 2]
+    assert parsed[1][1] is None
+
+    ids = [card_ids for _, card_ids in parsed if card_ids is not None]
+    parallel = model.HSModel.from_ids(ids, processes=2, cards=CARDS)
+    expected = model.HSModel.from_ids(ids, cards=CARDS)
+    assert np.array_equal(parallel._model.to_dense(), expected._model.to_dense())
+    assert np.array_equal(parallel._norm, expected._norm)
@@ -0,0 +1,72 @@
+import io
+import pickle
+import numpy as np
+import pytest
+from hearthstone import hsdata
+from hs_deckgen import model
+from hs_deckgen import storage
+from tests.conftest import CARDS, DECKS
+
+
+def assert_same_model(expected: model.HSModel, actual: model.HSModel) -> None:
+    assert np.array_equal(expected._model.to_dense(), actual._model.to_dense())
+    assert np.array_equal(expected._norm, actual._norm)
+    assert expected.same_layout(actual)
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_round_trip(kind):
+    mod = model.HSModel.from_decks(DECKS, kind, cards=CARDS)
+    stream = io.BytesIO()
+    mod.save(stream)
+    stream.seek(0)
+
+    assert_same_model(mod, model.HSModel.load(stream))
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_mmap_load(tmp_path, kind):
+    mod = model.HSModel.from_decks(DECKS, kind, cards=CARDS)
+    path = tmp_path / 'model.hsm'
+    with open(path, 'wb') as fout:
+        mod.save(fout)
+
+    with open(path, 'rb') as fin:
+        loaded = model.HSModel.load(fin, mmap_mode='r')
+    assert isinstance(loaded._norm, np.memmap)
+    assert_same_model(mod, loaded)
+
+    with open(path, 'r+b') as fin:
+        loaded = model.HSModel.load(fin, mmap_mode='r+')
+    loaded.train(DECKS[0])
+    mod.train(DECKS[0])
+    assert_same_model(mod, loaded)
+
+
+def test_load_legacy_pickle():
+    mod = model.HSModel.from_decks(DECKS, cards=CARDS)
+    legacy = model.HSModel.__new__(model.HSModel)
+    legacy._model = mod._model.to_dense()
+    legacy._norm = mod._norm
+    legacy._map = model.BijectiveMap([
+        ((int(db_id), int(copy)), slot) for slot, (db_id, copy) in enumerate(zip(mod._slot_db_id, mod._slot_copy))
+    ])
+    legacy._class_indexs = {}
+    for slot, hs_class in enumerate(mod._slot_class):
+        legacy._class_indexs.setdefault(hsdata.HSClass(int(hs_class)), []).append(slot)
+
+    assert_same_model(mod, model.HSModel.load(io.BytesIO(pickle.dumps(legacy))))
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_round_trip_keeps_dtypes(kind):
+    mod = model.HSModel.from_decks(DECKS, kind, cards=CARDS, dtype=np.uint16)
+    for saved in (mod, mod.normalized()):
+        stream = io.BytesIO()
+        saved.save(stream)
+        stream.seek(0)
+        loaded = model.HSModel.load(stream)
+
+        assert loaded.dtype == saved.dtype and loaded._model.to_dense().dtype == saved._model.to_dense().dtype
+        assert loaded._normalized == saved._normalized
+        assert_same_model(saved, loaded)
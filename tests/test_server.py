@@ -0,0 +1,74 @@
+import asyncio
+import http.client
+import json
+import threading
+import pytest
+from hs_deckgen import model
+from hs_deckgen import server
+from tests.conftest import DECKS
+
+
+@pytest.fixture
+def running_server(card_catalogue):
+
+    deck_server = server.DeckServer({'mage': model.HSModel.from_decks(DECKS, cards=card_catalogue)})
+    loop = asyncio.new_event_loop()
+    started = deck_server.start(loop, port=0)
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    yield started.sockets[0].getsockname()[1]
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    started.close()
+    loop.run_until_complete(started.wait_closed())
+    loop.close()
+
+
+def test_generate(running_server):
+    connection = http.client.HTTPConnection('127.0.0.1', running_server)
+    codes = server.request_decks(connection, [4], 'MAGE', count=3, seed=1)
+    # Keep-alive, the second request reuses the connection
+    assert codes == server.request_decks(connection, [4], 'MAGE', count=3, seed=1)
+    assert len(codes) == 3
+
+
+def test_bad_request(running_server):
+    connection = http.client.HTTPConnection('127.0.0.1', running_server)
+    with pytest.raises(ValueError):
+        server.request_decks(connection, [4], 'MAGE', model='missing')
+
+
+def test_metrics(running_server):
+    connection = http.client.HTTPConnection('127.0.0.1', running_server)
+    server.request_decks(connection, [4], 'MAGE', count=2, seed=1)
+    report = server.request_metrics(connection)
+
+    assert report['counters']['server.requests'] >= 2
+    assert report['stages']['model.generate']['calls'] >= 1
+
+
+def _post(connection, body):
+    connection.request('POST', '/generate', body=json.dumps(body), headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read().decode('utf-8'))
+
+
+def test_malformed_requests(running_server, monkeypatch):
+    # A request that hangs fails the test rather than blocking it
+    connection = http.client.HTTPConnection('127.0.0.1', running_server, timeout=10)
+    for body in ({'cards': [4] * 31, 'hs_class': 'MAGE'}, {'cards': [4], 'count': None}, {'cards': [4], 'count': '2'},
+                 {'cards': ['4']}, {'cards': [4], 'seed': 1.5}, [4],
+                 # No class to generate for, none given and none of the cards has one
+                 {'cards': []}, {'cards': [9]},
+                 {'cards': [4], 'hs_class': 'NEUTRAL'}, {'cards': [4], 'hs_class': ['MAGE']},
+                 {'cards': [4], 'count': 10 ** 7}, {'cards': [4], 'beam': 10 ** 7}):
+        status, payload = _post(connection, body)
+        assert status == 400 and 'error' in payload
+
+    def broken(self, request):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(server.DeckServer, 'generate', broken)
+    # Unexpected errors still get a response, on the same connection
+    assert _post(connection, {'cards': [4]})[0] == 500
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+from hearthstone import hsdata
+from hs_deckgen import model
+from hs_deckgen import storage
+from tests.conftest import CARDS, DECKS
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_storage_matches_dense(kind):
+    dense = model.HSModel('dense', CARDS)
+    other = model.HSModel(kind, CARDS)
+    for deck in DECKS:
+        dense.train(deck)
+        other.train(deck)
+
+    assert np.array_equal(dense._model.to_dense(), other._model.to_dense())
+    for index in range(len(other._model)):
+        assert np.array_equal(dense._model.row(index), other._model.row(index))
+    assert np.array_equal(dense._model.sum_rows([0, 3, 5]), other._model.sum_rows([0, 3, 5]))
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+@pytest.mark.usefixtures('card_catalogue')
+def test_generate_deck(kind):
+
+    mod = model.HSModel(kind, CARDS)
+    for deck in DECKS:
+        mod.train(deck)
+
+    generated = mod.generate_deck([CARDS[4]], hsdata.HSClass.MAGE, 4)
+    assert sorted(generated.cards) == sorted(DECKS[2])
+    assert all(c.hs_class is not hsdata.HSClass.WARRIOR for c in mod.generate_deck([], hsdata.HSClass.MAGE, 19))
+
+
+def test_sparse_smaller_than_dense():
+    dense = model.HSModel('dense', CARDS)
+    sparse = model.HSModel('sparse', CARDS)
+    dense.train(DECKS[0])
+    sparse.train(DECKS[0])
+
+    assert sparse._model.nbytes < dense._model.nbytes
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_train_many_matches_train(kind):
+    single = model.HSModel(kind, CARDS)
+    for deck in DECKS:
+        single.train(deck)
+
+    batched = model.HSModel(kind, CARDS)
+    batched.train_many(DECKS, batch_size=2)
+
+    assert np.array_equal(single._model.to_dense(), batched._model.to_dense())
+    assert np.array_equal(single._norm, batched._norm)
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_merge_matches_single_model(kind):
+    single = model.HSModel.from_decks(DECKS, kind, cards=CARDS)
+    parallel = model.HSModel.from_decks(DECKS, kind, processes=2, cards=CARDS)
+    merged = model.HSModel.merge(*[model.HSModel.from_decks([deck], kind, cards=CARDS) for deck in DECKS])
+
+    for other in (parallel, merged):
+        assert np.array_equal(single._model.to_dense(), other._model.to_dense())
+        assert np.array_equal(single._norm, other._norm)
+
+
+def test_merge_rejects_different_layouts():
+    with pytest.raises(ValueError):
+        model.HSModel.merge(model.HSModel('dense', CARDS), model.HSModel('dense', CARDS[:-1]))
+
+
+@pytest.mark.usefixtures('card_catalogue')
+def test_class_cache_invalidated_by_train():
+
+    mod = model.HSModel('dense', CARDS)
+    mod.generate_deck([], hsdata.HSClass.MAGE, 2)
+    columns = mod._class_cache[hsdata.HSClass.MAGE][0]
+    assert 20 not in columns
+
+    mod.train(DECKS[0])
+    assert not mod._class_cache
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+@pytest.mark.usefixtures('card_catalogue')
+def test_generate_decks(kind):
+
+    mod = model.HSModel.from_decks(DECKS, kind, cards=CARDS)
+    decks = mod.generate_decks([CARDS[4]], hsdata.HSClass.MAGE, 5, seed=3, deck_size=4)
+    assert all(sorted(generated.cards) == sorted(DECKS[2]) for generated in decks)
+
+    decks = mod.generate_decks([], hsdata.HSClass.MAGE, 6, seed=7, deck_size=19)
+    assert decks == mod.generate_decks([], hsdata.HSClass.MAGE, 6, seed=7, deck_size=19)
+    assert decks[:2] == mod.generate_decks([], hsdata.HSClass.MAGE, 2, seed=7, deck_size=19)
+    for generated in decks:
+        assert sorted(c.db_id for c in generated.cards) == sorted([i for i in range(8) for _ in range(2)] + [8, 9, 9])
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+@pytest.mark.parametrize('dtype', [np.uint16, np.uint32, np.float32])
+def test_count_dtype_matches_float64(kind, dtype):
+    expected = model.HSModel(kind, CARDS)
+    expected.train_many(DECKS)
+    narrow = model.HSModel(kind, CARDS, dtype)
+    narrow.train(DECKS[0])
+    narrow.train_many(DECKS[1:])
+    narrow.untrain_ids([[c.db_id for c in DECKS[0]]])
+    narrow.train(DECKS[0])
+
+    assert narrow.dtype == dtype and narrow._model.to_dense().dtype == dtype
+    assert np.array_equal(expected._model.to_dense(), narrow._model.to_dense())
+    assert np.array_equal(expected._norm, narrow._norm)
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+def test_count_overflow(kind):
+    mod = model.HSModel(kind, CARDS, np.uint16)
+    mod.train_many([DECKS[0]] * (65535 // 5 - 1))
+    before = mod._model.to_dense().copy(), mod._norm.copy()
+
+    with pytest.raises(OverflowError):
+        mod.train_many(DECKS)
+    with pytest.raises(OverflowError):
+        mod.train(DECKS[0])
+    with pytest.raises(OverflowError):
+        model.HSModel.merge(mod, mod)
+    assert np.array_equal(mod._model.to_dense(), before[0]) and np.array_equal(mod._norm, before[1])
+
+
+@pytest.mark.parametrize('kind', sorted(storage.STORAGES))
+@pytest.mark.usefixtures('card_catalogue')
+def test_normalized_generates_the_same_decks(kind):
+
+    mod = model.HSModel.from_decks(DECKS, kind, cards=CARDS, dtype=np.uint16)
+    normalized = mod.normalized()
+    assert normalized._model.to_dense().dtype == np.float16
+    assert normalized.generate_decks([CARDS[4]], hsdata.HSClass.MAGE, 3, seed=1, deck_size=4) == \
+        mod.generate_decks([CARDS[4]], hsdata.HSClass.MAGE, 3, seed=1, deck_size=4)
+    with pytest.raises(ValueError):
+        normalized.train(DECKS[0])
+
+
+def test_packed_keeps_one_triangle():
+    dense = model.HSModel('dense', CARDS)
+    packed = model.HSModel('packed', CARDS)
+    dense.train_many(DECKS)
+    packed.train_many(DECKS)
+
+    size = len(packed._model)
+    assert packed._model.nbytes == size * (size + 1) // 2 * 8 < dense._model.nbytes
+    rows, columns = np.array([3, 0, 12]), np.array([1, 12, 0, 5])
+    assert np.array_equal(packed._model.take_rows(rows, columns), dense._model.take_rows(rows, columns))
+
+
+def test_storages_share_a_base():
+    assert all(issubclass(kind, storage.Storage) for kind in storage.STORAGES.values())
+    with pytest.raises(TypeError):
+        storage.Storage(3)  # pylint: disable=abstract-class-instantiated
+    with pytest.raises(ValueError):
+        storage.DenseStorage.from_arrays(4, {'matrix': np.zeros([3, 3])})
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import numpy as np
+import pytest
+from hearthstone import deck
+from hs_deckgen import model
+from hs_deckgen import pipeline
+from hs_deckgen import update
+from tests.conftest import CARDS
+
+
+DECK_IDS = [[0, 0, 1, 2, 8], [1, 2, 3, 9, 9], [4, 5, 5, 6], [0, 3, 10]]
+
+
+def _records(lines):
+    return pipeline.read_records(io.StringIO('\n'.join(json.dumps(line) for line in lines)))
+
+
+@pytest.mark.parametrize('kind', ['dense', 'sparse', 'packed'])
+@pytest.mark.usefixtures('card_catalogue')
+def test_update_file(tmp_path, kind):
+    codes = deck.encode_deck_codes([0] * len(DECK_IDS), [np.array(ids) for ids in DECK_IDS])
+    path = str(tmp_path / 'model')
+    model.HSModel(kind, CARDS).save_file(path)
+    log = update.DeckLog(path + '.log')
+
+    first = update.update_file(path, log, _records(codes[:3]))
+    # Decks already in the model are not counted twice, the last line about a deck wins
+    second = update.update_file(path, log, _records([codes[0], {'remove': codes[1]}, {'remove': codes[3]}, codes[3]]))
+
+    assert (first.added, first.removed, second.added, second.removed) == (3, 0, 1, 1)
+    assert sorted(log.included()) == sorted([codes[0], codes[2], codes[3]])
+
+    expected = model.HSModel(kind, CARDS)
+    expected.train_ids([DECK_IDS[0], DECK_IDS[2], DECK_IDS[3]])
+    with open(path, 'rb') as stream:
+        updated = model.HSModel.load(stream)
+    assert np.allclose(updated._model.to_dense(), expected._model.to_dense())
+    assert np.allclose(updated._norm, expected._norm)
+
+
+def _crash(*_):
+    raise RuntimeError('crash')
+
+
+@pytest.mark.parametrize('kind', ['dense', 'sparse', 'packed'])
+@pytest.mark.parametrize('crash_in', ['apply_delta', 'commit'])
+@pytest.mark.usefixtures('card_catalogue')
+def test_crashed_update_is_recovered(monkeypatch, tmp_path, kind, crash_in):
+    codes = deck.encode_deck_codes([0] * len(DECK_IDS), [np.array(ids) for ids in DECK_IDS])
+    path = str(tmp_path / 'model')
+    model.HSModel(kind, CARDS).save_file(path)
+    log = update.DeckLog(path + '.log')
+    update.update_file(path, log, _records(codes[:2]))
+
+    with monkeypatch.context() as crashing:
+        if crash_in == 'apply_delta':
+            # Half of the update reaches the model file before the crash
+            apply_delta = update.apply_delta
+            crashing.setattr(update, 'apply_delta', lambda mod, entries, *_: (apply_delta(mod, entries[:1]), _crash()))
+        else:
+            crashing.setattr(update.DeckLog, 'commit', _crash)
+        with pytest.raises(RuntimeError):
+            update.update_file(path, log, _records([codes[2], {'remove': codes[0]}]))
+    # Uncommitted, the update doesn't count until it is recovered
+    assert sorted(log.included()) == sorted(codes[:2])
+    assert os.path.exists(path + '.journal') == (kind != 'sparse')
+
+    update.update_file(path, log, _records([codes[3]]))
+    assert not os.path.exists(path + '.journal')
+    included = log.included()
+    # Only a model saved whole before the crash keeps the update, an in-place one is rolled back
+    rolled_forward = kind == 'sparse' and crash_in == 'commit'
+    assert sorted(included) == sorted(codes[1:] if rolled_forward else [codes[0], codes[1], codes[3]])
+
+    expected = model.HSModel(kind, CARDS)
+    expected.train_ids(included.values())
+    with open(path, 'rb') as stream:
+        updated = model.HSModel.load(stream)
+    assert np.allclose(updated._model.to_dense(), expected._model.to_dense())
+    assert np.allclose(updated._norm, expected._norm)
+
+
+def test_log_snapshot(tmp_path):
+    log = update.DeckLog(str(tmp_path / 'log'))
+    for key in 'abc':
+        log.begin([{'op': 'add', 'key': key, 'cards': [1]}])
+        log.commit()
+    assert os.path.exists(log.snapshot_path)
+    log.begin([{'op': 'remove', 'key': 'a'}])
+    log.commit()
+    # Entries outside an update, as older logs have them, count straight away
+    with open(log.path, 'a') as stream:
+        stream.write(json.dumps({'op': 'add', 'key': 'd', 'cards': [2]}) + '\n')
+    assert log.included() == {'b': [1], 'c': [1], 'd': [2]}
+    os.unlink(log.snapshot_path)
+    assert log.included() == {'b': [1], 'c': [1], 'd': [2]}
+
+
+def test_untrain_reverses_train():
+    trained = model.HSModel('dense', CARDS)
+    trained.train_ids(DECK_IDS)
+    trained.untrain_ids(DECK_IDS[1:3])
+
+    expected = model.HSModel('dense', CARDS)
+    expected.train_ids([DECK_IDS[0], DECK_IDS[3]])
+    assert np.array_equal(trained._model.to_dense(), expected._model.to_dense())
+    assert np.array_equal(trained._norm, expected._norm)